@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天流量压测
+模拟大群刷屏：以固定速率向SCPSLServerQuery的命令处理函数发送/cx、/xy、/zc、/groups和"炸了?"消息，
+查询目标为本地模拟服务器集群（fake_a2s_server.py）
+统计每类消息的处理延迟分布、事件循环延迟和内存峰值，保存为JSON
+需要安装astrbot；插件会被复制到临时目录加载，不会改动插件自身的数据库
+"""
+
+import argparse
+import asyncio
+import gc
+import importlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+from bench_query import count_fds, percentile
+from fake_a2s_server import spawn_fleet
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 默认消息比例
+DEFAULT_MIX = "cx=30,xy=20,zc=25,groups=5,boom=20"
+
+
+class StubContext:
+    """插件构造时需要的Context，压测中不会用到其中的功能"""
+
+
+class SyntheticEvent:
+    """只实现命令处理函数用到的AstrMessageEvent属性"""
+
+    __slots__ = ("message_str", "group_id", "session_id", "user_id")
+
+    def __init__(self, message_str: str, group_id: Optional[str], user_id: str):
+        self.message_str = message_str
+        self.group_id = group_id
+        self.session_id = group_id or "private"
+        self.user_id = user_id
+
+    def plain_result(self, text: str) -> str:
+        return text
+
+
+def load_plugin(workdir: str):
+    """把插件复制到临时目录并作为包导入，返回main模块"""
+    package = "scpsl_bench_plugin"
+    target = os.path.join(workdir, package)
+    shutil.copytree(
+        PLUGIN_DIR, target,
+        ignore=shutil.ignore_patterns("*.db", "*.db-*", "__pycache__", ".git", "bench_*.json"),
+    )
+    sys.path.insert(0, workdir)
+    return importlib.import_module(f"{package}.main")
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+class LoopLagMonitor:
+    """每interval秒检查一次事件循环的调度延迟"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+
+def latency_summary(values: List[float]) -> Dict[str, Any]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+async def run_load(args, main_module, live: List[tuple], dead: List[tuple]) -> Dict[str, Any]:
+    # 预设服务器指向模拟集群，/xy 不访问外网
+    config = {"groups": [{"name": "模拟服务器", "servers": [
+        {"name": f"模拟服#{i + 1}", "address": f"{ip}:{port}"} for i, (ip, port) in enumerate(live[:args.preset])
+    ]}]}
+    with open(os.path.join(os.path.dirname(main_module.__file__), "servers.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False)
+    plugin = main_module.SCPSLServerQuery(StubContext())
+    plugin.timeout = args.timeout
+
+    # 预先给模拟群聊绑定服务器（包含部分不响应的地址）
+    targets = live + dead
+    groups = [f"bench_group_{i}" for i in range(args.groups)]
+    for i, group_id in enumerate(groups):
+        ip, port = targets[i % len(targets)]
+        await plugin._set_group_server(group_id, ip, port, f"模拟群服#{i}")
+
+    handlers = {
+        "cx": (plugin.query_server_status, lambda: "/cx {} {}".format(*random.choice(targets))),
+        "xy": (plugin.query_chunyu_servers, lambda: "/xy"),
+        "zc": (plugin.query_group_server, lambda: "/zc"),
+        "groups": (plugin.list_all_groups, lambda: "/groups"),
+        "boom": (plugin.auto_check_server, lambda: "服务器炸了?"),
+    }
+    mix = parse_mix(args.mix)
+    kinds = [k for k in mix if k in handlers]
+    weights = [mix[k] for k in kinds]
+
+    latencies: Dict[str, List[float]] = {k: [] for k in kinds}
+    errors: Dict[str, int] = {}
+    in_flight = 0
+    peak_in_flight = 0
+
+    async def dispatch(kind: str, scheduled: float):
+        nonlocal in_flight, peak_in_flight
+        handler, make_message = handlers[kind]
+        event = SyntheticEvent(make_message(), random.choice(groups), f"bench_user_{random.randrange(1000)}")
+        in_flight += 1
+        peak_in_flight = max(peak_in_flight, in_flight)
+        try:
+            async for _ in handler(event):
+                pass
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        finally:
+            in_flight -= 1
+        # 从计划发送时间算起，包含事件循环排队时间
+        latencies[kind].append(time.perf_counter() - scheduled)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    gc.collect()
+    lag = LoopLagMonitor()
+    lag.start()
+
+    tasks = set()
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    for n in range(total):
+        scheduled = started + n / args.rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(dispatch(random.choices(kinds, weights)[0], scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    send_elapsed = time.perf_counter() - started
+    if tasks:
+        await asyncio.wait(set(tasks))
+    elapsed = time.perf_counter() - started
+    lag.stop()
+
+    fds = count_fds()
+    traced_peak = None
+    if args.tracemalloc:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    await plugin.terminate()
+
+    max_rss_kb = None
+    if resource is not None:
+        # Linux上ru_maxrss单位为KB，macOS上为字节
+        max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            max_rss_kb //= 1024
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    return {
+        "events": total,
+        "target_rate": args.rate,
+        "achieved_rate": round(total / send_elapsed, 1) if send_elapsed else 0.0,
+        "completed_rate": round(total / elapsed, 1) if elapsed else 0.0,
+        "elapsed": round(elapsed, 3),
+        "peak_in_flight": peak_in_flight,
+        "errors": errors,
+        "latency": latency_summary(all_latencies),
+        "latency_by_command": {k: latency_summary(v) for k, v in latencies.items()},
+        "loop_lag": latency_summary(lag.samples),
+        "max_rss_kb": max_rss_kb,
+        "tracemalloc_peak_bytes": traced_peak,
+        "fds": fds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SCP:SL插件聊天流量压测")
+    parser.add_argument("--rate", type=float, default=1000, help="每秒消息数")
+    parser.add_argument("--duration", type=float, default=10, help="持续秒数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="消息比例，如 cx=30,xy=20,zc=25,groups=5,boom=20")
+    parser.add_argument("--servers", type=int, default=50, help="模拟服务器数量")
+    parser.add_argument("--dead", type=int, default=5, help="不响应的端口数量")
+    parser.add_argument("--preset", type=int, default=6, help="/xy查询的服务器数量")
+    parser.add_argument("--groups", type=int, default=200, help="已绑定服务器的群聊数量")
+    parser.add_argument("--base-port", type=int, default=41000)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=1.0, help="插件的查询超时")
+    parser.add_argument("--tracemalloc", action="store_true", help="用tracemalloc统计Python内存峰值（会降低吞吐）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_chat_result.json", help="结果JSON文件")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    proc, live, dead = spawn_fleet(
+        args.servers, args.base_port, args.dead,
+        latency=args.latency, jitter=args.jitter, loss=args.loss, split_size=400, rules=40,
+    )
+    workdir = tempfile.mkdtemp(prefix="scpsl_bench_")
+    try:
+        main_module = load_plugin(workdir)
+        result = asyncio.run(run_load(args, main_module, live, dead))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "result": result,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"消息: {result['events']}  目标速率: {args.rate}/s  实际发送: {result['achieved_rate']}/s  "
+          f"完成: {result['completed_rate']}/s  最大并发: {result['peak_in_flight']}")
+    for kind, summary in result["latency_by_command"].items():
+        print(f"{kind:<8} n={summary['count']:<6} p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms "
+              f"p99={summary['p99_ms']}ms max={summary['max_ms']}ms")
+    print(f"事件循环延迟 p99={result['loop_lag']['p99_ms']}ms max={result['loop_lag']['max_ms']}ms")
+    print(f"内存峰值 {result['max_rss_kb']}KB  描述符 {result['fds']}  错误 {result['errors']}")
+    print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
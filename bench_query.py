@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询引擎压测
+启动本地模拟服务器集群（fake_a2s_server.py，独立进程），对A2SClient、StatusCache和gather_bounded
+组成的查询路径进行压测，输出每个场景的qps、p50/p95/p99延迟和文件描述符占用，并保存为JSON
+可用 --compare 与上一次的结果对比
+不依赖astrbot框架
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fake_a2s_server import spawn_fleet
+from scpsl import A2SClient, StatusCache, gather_bounded
+
+Address = Tuple[str, int]
+
+
+def count_fds() -> Optional[int]:
+    """当前进程打开的文件描述符数量，不支持的平台返回None"""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class FdSampler:
+    """压测期间定期采样文件描述符数量，记录峰值"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = count_fds()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            fds = count_fds()
+            if fds is not None and (self.peak is None or fds > self.peak):
+                self.peak = fds
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def run_scenario(
+    name: str,
+    calls: int,
+    concurrency: int,
+    make_call: Callable[[int], Any],
+) -> Dict[str, Any]:
+    """以固定并发执行calls次make_call(i)，统计延迟、成功率和描述符占用"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    next_index = 0
+    fds_before = count_fds()
+
+    async def worker():
+        nonlocal next_index
+        while next_index < calls:
+            i = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                result = await make_call(i)
+                if isinstance(result, list):
+                    # 批量查询：统计其中失败的条目
+                    for item in result:
+                        if item is None or isinstance(item, BaseException):
+                            kind = "deadline" if item is None else type(item).__name__
+                            errors[kind] = errors.get(kind, 0) + 1
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            latencies.append(time.perf_counter() - start)
+
+    with FdSampler() as sampler:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "calls": calls,
+        "concurrency": concurrency,
+        "elapsed": round(elapsed, 4),
+        "qps": round(calls / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "errors": errors,
+        "fds_before": fds_before,
+        "fds_peak": sampler.peak,
+        "fds_after": count_fds(),
+    }
+    print(
+        f"{name:<12} qps={result['qps']:<9} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+        f"p99={result['p99_ms']}ms fds={fds_before}->{sampler.peak}->{result['fds_after']} errors={errors}"
+    )
+    return result
+
+
+async def run_benchmarks(args, live: List[Address], dead: List[Address]) -> Dict[str, Any]:
+    client = A2SClient(timeout=args.timeout)
+    results: Dict[str, Any] = {}
+    try:
+        # 预热：记住查询端口和challenge，之后的场景测量稳态性能
+        await gather_bounded(live, lambda a: client.query_server(*a), args.concurrency, args.timeout * 2)
+
+        results["single"] = await run_scenario(
+            "single", min(args.calls, 200), 1,
+            lambda i: client.query_server(*live[i % len(live)]),
+        )
+        results["concurrent"] = await run_scenario(
+            "concurrent", args.calls, args.concurrency,
+            lambda i: client.query_server(*live[i % len(live)]),
+        )
+
+        # 与插件query_scpsl_server相同的缓存路径：大量重复请求集中在少数服务器上
+        cache = StatusCache(ttl=args.cache_ttl, stale_ttl=args.cache_ttl * 3)
+        hot = live[:max(1, min(len(live), 5))]
+        results["cached"] = await run_scenario(
+            "cached", args.calls, args.concurrency,
+            lambda i: cache.get(hot[i % len(hot)], lambda a=hot[i % len(hot)]: client.query_server(*a)),
+        )
+
+        results["details"] = await run_scenario(
+            "details", min(args.calls, 1000), args.concurrency,
+            lambda i: client.query_details(*live[i % len(live)]),
+        )
+
+        # 与/xy相同的批量路径：整个集群（含不响应的端口）为一批
+        fleet = live + dead
+        results["batch"] = await run_scenario(
+            "batch", args.batch_rounds, 1,
+            lambda i: gather_bounded(
+                fleet, lambda a: client.query_server(*a), args.batch_concurrency, args.batch_deadline
+            ),
+        )
+        results["batch"]["batch_size"] = len(fleet)
+        results["batch"]["reassembly_dropped"] = client.reassembler.dropped
+    finally:
+        client.close()
+    return results
+
+
+def compare(current: Dict[str, Any], previous_path: str):
+    """打印与上一次结果的qps和p95对比"""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f).get("scenarios", {})
+    print(f"\n与 {previous_path} 对比:")
+    for name, now in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        qps_change = (now["qps"] / before["qps"] - 1) * 100 if before["qps"] else 0.0
+        print(
+            f"{name:<12} qps {before['qps']} -> {now['qps']} ({qps_change:+.1f}%), "
+            f"p95 {before['p95_ms']}ms -> {now['p95_ms']}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SCP:SL查询引擎压测")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=40000)
+    parser.add_argument("--servers", type=int, default=200, help="模拟服务器数量")
+    parser.add_argument("--dead", type=int, default=10, help="不响应的端口数量")
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--split-size", type=int, default=0, help="响应分包大小，0为不分包")
+    parser.add_argument("--rules", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=5000, help="每个场景的调用次数")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--cache-ttl", type=float, default=10.0)
+    parser.add_argument("--batch-rounds", type=int, default=5)
+    parser.add_argument("--batch-concurrency", type=int, default=16)
+    parser.add_argument("--batch-deadline", type=float, default=15.0)
+    parser.add_argument("--output", default="bench_result.json", help="结果JSON文件")
+    parser.add_argument("--compare", help="上一次的结果JSON文件")
+    args = parser.parse_args()
+
+    proc, live, dead = spawn_fleet(
+        args.servers, args.base_port, args.dead, args.host,
+        latency=args.latency, jitter=args.jitter, loss=args.loss,
+        split_size=args.split_size, rules=args.rules,
+    )
+    try:
+        scenarios = asyncio.run(run_benchmarks(args, live, dead))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到 {args.output}")
+
+    if args.compare:
+        compare(scenarios, args.compare)
+
+
+if __name__ == "__main__":
+    main()
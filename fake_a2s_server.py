@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟A2S服务器
+可在localhost上同时运行数百个实例，用于离线测试和压测查询引擎
+支持challenge、A2S_INFO/PLAYER/RULES、延迟与抖动、丢包、分包响应和不响应的端口
+不依赖astrbot框架
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import struct
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+A2S_HEADER = b"\xFF\xFF\xFF\xFF"
+SPLIT_HEADER = b"\xFE\xFF\xFF\xFF"
+
+
+@dataclass
+class FakeServerConfig:
+    """单个模拟服务器的行为"""
+
+    # 基础延迟与随机抖动（秒）
+    latency: float = 0.0
+    jitter: float = 0.0
+    # 丢弃收到的请求的概率
+    loss: float = 0.0
+    # 是否要求challenge
+    challenge: bool = True
+    # 响应超过该长度时拆分为多个分包，0表示从不拆分
+    split_size: int = 0
+    players: int = 12
+    max_players: int = 30
+    # A2S_RULES中的规则数量，数量多时便于测试分包
+    rules: int = 8
+    name: str = "Fake SCP:SL Server"
+
+
+class FakeA2SServer(asyncio.DatagramProtocol):
+    """模拟一个SCP:SL服务器的A2S查询端口"""
+
+    def __init__(self, config: FakeServerConfig):
+        self.config = config
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.challenge_value = os.urandom(4)
+        self.received = 0
+        self.sent = 0
+        self._request_id = random.randrange(1, 1 << 30)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        self.received += 1
+        config = self.config
+        if config.loss and random.random() < config.loss:
+            return
+        reply = self._handle(data)
+        if reply is None:
+            return
+        delay = config.latency + (random.uniform(0, config.jitter) if config.jitter else 0.0)
+        packets = self._split(reply)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._send, packets, addr)
+        else:
+            self._send(packets, addr)
+
+    def _send(self, packets: List[bytes], addr):
+        if self.transport is None or self.transport.is_closing():
+            return
+        for packet in packets:
+            self.transport.sendto(packet, addr)
+            self.sent += 1
+
+    def _handle(self, data: bytes) -> Optional[bytes]:
+        if len(data) < 5 or data[:4] != A2S_HEADER:
+            return None
+        kind = data[4]
+        if kind == 0x54:
+            body = data[5:]
+            if not body.startswith(b"Source Engine Query\x00"):
+                return None
+            challenge = body[len(b"Source Engine Query\x00"):]
+            if self.config.challenge and challenge != self.challenge_value:
+                return self._challenge()
+            return self._info()
+        if kind in (0x55, 0x56):
+            if data[5:9] != self.challenge_value:
+                return self._challenge()
+            return self._players() if kind == 0x55 else self._rules()
+        return None
+
+    def _challenge(self) -> bytes:
+        return A2S_HEADER + b"\x41" + self.challenge_value
+
+    def _info(self) -> bytes:
+        c = self.config
+        return (
+            A2S_HEADER + b"\x49\x11"
+            + c.name.encode() + b"\x00"
+            + b"Facility\x00"
+            + b"scpsl\x00"
+            + b"SCP: Secret Laboratory\x00"
+            + struct.pack("<HBBBccBB", 0, c.players, c.max_players, 0, b"d", b"l", 0, 0)
+        )
+
+    def _players(self) -> bytes:
+        body = bytearray(A2S_HEADER + b"\x44" + bytes([self.config.players]))
+        for i in range(self.config.players):
+            body += bytes([i]) + f"Player{i}".encode() + b"\x00" + struct.pack("<lf", i, 60.0 * i)
+        return bytes(body)
+
+    def _rules(self) -> bytes:
+        body = bytearray(A2S_HEADER + b"\x45" + struct.pack("<H", self.config.rules + 1))
+        body += b"RoundTime\x0000:05:23\x00"
+        for i in range(self.config.rules):
+            body += f"rule_{i}".encode() + b"\x00" + f"value_{i}".encode() + b"\x00"
+        return bytes(body)
+
+    def _split(self, reply: bytes) -> List[bytes]:
+        size = self.config.split_size
+        if not size or len(reply) <= size:
+            return [reply]
+        self._request_id = (self._request_id + 1) & 0x7FFFFFFF
+        chunks = [reply[i:i + size] for i in range(0, len(reply), size)]
+        return [
+            SPLIT_HEADER + struct.pack("<lBBH", self._request_id, len(chunks), n, size) + chunk
+            for n, chunk in enumerate(chunks)
+        ]
+
+
+class FakeFleet:
+    """在连续端口上启动一组模拟服务器"""
+
+    def __init__(self, host: str = "127.0.0.1"):
+        self.host = host
+        self.servers: List[FakeA2SServer] = []
+        self.addresses: List[Tuple[str, int]] = []
+        self.dead_addresses: List[Tuple[str, int]] = []
+        self._transports: List[asyncio.DatagramTransport] = []
+
+    async def start(self, count: int, base_port: int, config: FakeServerConfig, dead: int = 0):
+        """
+        启动count个正常服务器和dead个不响应的端口
+        端口从base_port开始，每个服务器占用两个端口（游戏端口和未使用的相邻端口）
+        """
+        loop = asyncio.get_running_loop()
+        for i in range(count + dead):
+            port = base_port + i * 2
+            if i < count:
+                transport, server = await loop.create_datagram_endpoint(
+                    lambda: FakeA2SServer(config), local_addr=(self.host, port)
+                )
+                self.servers.append(server)
+                self.addresses.append((self.host, port))
+            else:
+                # 绑定端口但从不回复，模拟宕机的服务器
+                transport, _ = await loop.create_datagram_endpoint(
+                    asyncio.DatagramProtocol, local_addr=(self.host, port)
+                )
+                self.dead_addresses.append((self.host, port))
+            self._transports.append(transport)
+        return self
+
+    def close(self):
+        for transport in self._transports:
+            transport.close()
+        self._transports.clear()
+
+
+def spawn_fleet(
+    count: int,
+    base_port: int = 40000,
+    dead: int = 0,
+    host: str = "127.0.0.1",
+    **options,
+) -> Tuple[subprocess.Popen, List[Tuple[str, int]], List[Tuple[str, int]]]:
+    """
+    以独立进程启动模拟服务器集群，返回 (进程, 正常服务器地址, 不响应的地址)
+    options为命令行参数，如 latency=0.01, split_size=400；使用完毕后需结束进程
+    """
+    cmd = [
+        sys.executable, os.path.abspath(__file__),
+        "--host", host, "--base-port", str(base_port), "--count", str(count), "--dead", str(dead),
+    ]
+    for key, value in options.items():
+        flag = "--" + key.replace("_", "-")
+        if value is True:
+            cmd.append(flag)
+        elif value is not False and value is not None:
+            cmd += [flag, str(value)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith("ready"):
+        proc.kill()
+        raise RuntimeError(f"模拟服务器集群启动失败: {line!r}")
+    ports = [base_port + i * 2 for i in range(count + dead)]
+    live = [(host, p) for p in ports[:count]]
+    dead_addresses = [(host, p) for p in ports[count:]]
+    return proc, live, dead_addresses
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="本地模拟A2S服务器集群")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=40000)
+    parser.add_argument("--count", type=int, default=100, help="正常服务器数量")
+    parser.add_argument("--dead", type=int, default=0, help="不响应的端口数量")
+    parser.add_argument("--latency", type=float, default=0.005, help="基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.005, help="随机抖动（秒）")
+    parser.add_argument("--loss", type=float, default=0.0, help="丢包率")
+    parser.add_argument("--no-challenge", action="store_true", help="不要求challenge")
+    parser.add_argument("--split-size", type=int, default=0, help="响应分包大小，0为不分包")
+    parser.add_argument("--rules", type=int, default=8, help="A2S_RULES规则数量")
+    return parser
+
+
+def config_from_args(args) -> FakeServerConfig:
+    return FakeServerConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        loss=args.loss,
+        challenge=not args.no_challenge,
+        split_size=args.split_size,
+        rules=args.rules,
+    )
+
+
+async def main():
+    args = build_parser().parse_args()
+    fleet = await FakeFleet(args.host).start(args.count, args.base_port, config_from_args(args), args.dead)
+    # 输出ready行，供压测脚本等待集群就绪
+    print(f"ready {len(fleet.addresses)} {len(fleet.dead_addresses)}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        fleet.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,15 +1,35 @@
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger
-import socket
-import struct
 import asyncio
 import time
-from typing import Dict, Any, Optional, Tuple
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
 import re
-import sqlite3
 import os
-from datetime import datetime
+
+from .scpsl import (
+    A2SClient,
+    BindingIndex,
+    CircuitBreaker,
+    HistoryCompactor,
+    HistoryStore,
+    HostResolver,
+    KeywordMatcher,
+    MetricsExporter,
+    QueryMetrics,
+    SampleWriter,
+    ServerInfo,
+    ServerRegistry,
+    StatusCache,
+    StatusPoller,
+    Storage,
+    TargetError,
+    expand_targets,
+    gather_bounded,
+)
+from .scpsl.history import OFFLINE
+from .scpsl.parser import A2SError
 
 @register("scpsl_server_query", "若梦", "SCP:SL服务器查询插件，仿照server_Qchat功能", "1.0.0")
 class SCPSLServerQuery(Star):
@@ -17,18 +37,126 @@ class SCPSLServerQuery(Star):
         super().__init__(context)
         self.default_port = 7777
         self.timeout = 5
+        # 自适应超时：按每个服务器的RTT决定重发间隔（限制在min_rto~max_rto秒），
+        # 重发max_retries次仍无回复即判定离线，timeout只是单次查询的总上限
+        self.min_rto = 0.1
+        self.max_rto = 3.0
+        self.max_retries = 2
+        # 主机名解析结果缓存dns_ttl秒，解析失败缓存dns_negative_ttl秒
+        self.dns_ttl = 300
+        self.dns_negative_ttl = 30
+        self.resolver = HostResolver(self.dns_ttl, self.dns_negative_ttl)
+        # 非阻塞A2S查询引擎
+        self.a2s = A2SClient(
+            timeout=self.timeout,
+            min_rto=self.min_rto,
+            max_rto=self.max_rto,
+            max_retries=self.max_retries,
+            resolver=self.resolver,
+        )
+        # 批量查询的最大并发数与总截止时间（秒）
+        self.batch_concurrency = 16
+        self.batch_deadline = 15
+        # /cx一次查询多个地址（端口范围、网段）时的目标数上限、并发数与总截止时间（秒），默认仅管理员可用
+        self.bulk_max_targets = 64
+        self.bulk_concurrency = 32
+        self.bulk_deadline = 8
+        self.bulk_admin_only = True
+        # 状态缓存：cache_ttl秒内直接使用缓存，之后cache_stale_ttl秒内先返回旧结果并后台刷新
+        self.cache_ttl = 10
+        self.cache_stale_ttl = 30
+        self.status_cache = StatusCache(self.cache_ttl, self.cache_stale_ttl)
+        # 熔断：连续失败breaker_failure_threshold次的服务器直接判定离线，
+        # 等待breaker_base_backoff秒（每次加倍，最长breaker_max_backoff秒）后由一次后台探测决定是否恢复
+        self.breaker_failure_threshold = 2
+        self.breaker_base_backoff = 10
+        self.breaker_max_backoff = 300
+        self.breaker = CircuitBreaker(
+            failure_threshold=self.breaker_failure_threshold,
+            base_backoff=self.breaker_base_backoff,
+            max_backoff=self.breaker_max_backoff,
+        )
+        self._probe_tasks = set()
+        # 预设服务器从servers.json加载，文件修改后无需重启即可生效
+        self.registry_path = os.path.join(os.path.dirname(__file__), 'servers.json')
+        self.registry = ServerRegistry(self.registry_path, logger=logger)
+        self.registry.refresh()
+        # 自动检测的触发关键词；同一群聊trigger_cooldown秒内再次触发时直接复用上一次的回复
+        self.trigger_keywords = ["炸了?", "炸了？"]
+        self.trigger_cooldown = 30
+        self.trigger = KeywordMatcher(self.trigger_keywords)
+        self.trigger_replies = StatusCache(self.trigger_cooldown, 0)
+        # /cx最多显示的玩家数
+        self.player_list_limit = 10
+        # 人数历史：每个服务器保留最近history_capacity个样本，/trend默认统计trend_hours小时
+        self.history_capacity = 8640
+        self.trend_hours = 6
+        self.history = HistoryStore(self.history_capacity)
         self.db_path = os.path.join(os.path.dirname(__file__), 'group_servers.db')
+        # 数据库长连接，所有操作在专用线程上执行
+        self.storage = Storage(self.db_path)
+        # 人数历史同时写入数据库：每sample_flush_interval秒或每sample_batch_size个样本批量写入一次
+        self.sample_flush_interval = 5
+        self.sample_batch_size = 500
+        self.sample_writer = SampleWriter(
+            self.storage.insert_samples,
+            flush_interval=self.sample_flush_interval,
+            batch_size=self.sample_batch_size,
+            logger=logger,
+        )
+        # 人数历史的汇总与保留：原始样本、1分钟汇总、1小时汇总分别保留的天数，1天汇总永久保留
+        self.raw_retention_days = 2
+        self.minute_retention_days = 14
+        self.hour_retention_days = 180
+        self.compactor = HistoryCompactor(
+            self.storage,
+            retention=(
+                self.raw_retention_days * 86400,
+                self.minute_retention_days * 86400,
+                self.hour_retention_days * 86400,
+            ),
+            logger=logger,
+        )
+        # 群聊绑定的内存索引，写数据库时同步更新
+        self.bindings = BindingIndex()
+        # /groups每页显示的群聊数
+        self.groups_page_size = 10
         # 管理员OpenID列表
         self.admin_openids = set()
         self._init_database()
         self._init_admin_system()
+        self._init_bindings()
         
         # 添加指定的管理员OpenID
         self._ensure_admin_exists("o_2Tqls-aOEGHVOqZVz6M2kZWtmrpU", "系统管理员")
         
+        # 查询指标：/scpsl_stats查看，并每metrics_export_interval秒写入Prometheus文本文件
+        self.metrics = QueryMetrics()
+        self._register_metrics()
+        self.metrics_path = os.path.join(os.path.dirname(__file__), 'scpsl_metrics.prom')
+        self.metrics_export_interval = 30
+        self.metrics_exporter = MetricsExporter(
+            self.metrics,
+            self.metrics_path,
+            interval=self.metrics_export_interval,
+            logger=logger,
+        )
+        
+        # 后台轮询预设服务器和所有群聊绑定的服务器，命令直接读取缓存快照
+        # 轮询间隔需小于cache_ttl，被轮询的服务器才能一直命中缓存
+        self.poll_interval = 8
+        self.poller = StatusPoller(
+            self._get_poll_targets,
+            self._refresh_server_status,
+            interval=self.poll_interval,
+            concurrency=self.batch_concurrency,
+            logger=logger,
+        )
+        self._start_background()
+        
     @filter.command("cx")
     async def query_server_status(self, event: AstrMessageEvent):
-        """查询SCP:SL服务器在线人数和状态"""
+        """查询SCP:SL服务器在线人数和状态，可一次查询多个地址、端口范围或网段"""
         message_parts = event.message_str.strip().split()
         
         if len(message_parts) < 2:
@@ -37,8 +165,19 @@ class SCPSLServerQuery(Star):
             
         server_ip = message_parts[1]
         
+        if self._is_bulk_query(message_parts[1:]):
+            try:
+                targets = expand_targets(message_parts[1:], self.default_port, self.bulk_max_targets)
+            except TargetError as e:
+                yield event.plain_result(f"❌ {e}")
+                return
+            if len(targets) > 1:
+                async for result in self._query_bulk(event, targets):
+                    yield result
+                return
+            server_ip, server_port = targets[0]
         # 解析端口参数，添加错误处理
-        if len(message_parts) > 2:
+        elif len(message_parts) > 2:
             try:
                 # 清理端口参数，移除可能的方括号或其他字符
                 port_str = message_parts[2].strip('[]')
@@ -53,7 +192,7 @@ class SCPSLServerQuery(Star):
             server_port = self.default_port
         
         try:
-            server_info = await self.query_scpsl_server(server_ip, server_port)
+            server_info = await self.query_scpsl_server_details(server_ip, server_port)
             if server_info:
                 response = f"🎮 SCP:SL 服务器状态\n"
                 response += f"📍 服务器: {server_ip}:{server_port}\n"
@@ -62,66 +201,119 @@ class SCPSLServerQuery(Star):
                 response += f"🎯 游戏模式: {server_info.get('gamemode', 'Unknown')}\n"
                 response += f"🗺️ 地图: {server_info.get('map', 'Unknown')}\n"
                 response += f"⏱️ 回合时间: {server_info.get('round_time', 'N/A')}\n"
+                response += f"🌐 延迟: {server_info.get('ping', 'N/A')}ms\n"
                 response += f"🔄 状态: {'🟢 在线' if server_info.get('online') else '🔴 离线'}"
-                yield event.plain_result(response)
+                player_list = server_info.get('player_list') or []
+                if player_list:
+                    response += f"\n\n🧑 玩家列表:\n"
+                    for name, duration in player_list[:self.player_list_limit]:
+                        response += f"• {name or '未知玩家'} ({int(duration) // 60}分钟)\n"
+                    if len(player_list) > self.player_list_limit:
+                        response += f"… 等共 {len(player_list)} 名玩家"
+                yield event.plain_result(response.rstrip())
             else:
-                yield event.plain_result(f"❌ 无法连接到服务器 {server_ip}:{server_port}\n请检查IP地址和端口是否正确！")
+                yield event.plain_result(f"❌ 无法连接到服务器 {server_ip}:{server_port}\n🔄 状态: 🔴 {self._offline_status(server_ip, server_port)}\n请检查IP地址和端口是否正确！")
         except Exception as e:
             logger.error(f"查询服务器时出错: {e}")
             yield event.plain_result(f"❌ 查询失败: {str(e)}")
     
 
     
+    @staticmethod
+    def _is_bulk_query(args: List[str]) -> bool:
+        """是否使用批量语法：ip:端口、端口范围、网段、多个地址（/cx <IP> [端口] 仍按单个服务器解析）"""
+        if any(':' in arg or '/' in arg or ',' in arg for arg in args):
+            return True
+        # 空格分隔的多个地址；第二个参数不像地址时按 /cx <IP> [端口] 处理
+        return len(args) > 1 and all('.' in arg for arg in args[1:])
+    
+    async def _query_bulk(self, event: AstrMessageEvent, targets: List[Tuple[str, int]]):
+        """并发查询多个服务器，按在线状态和人数排序输出一张简表"""
+        user_openid = self._get_user_openid(event)
+        if self.bulk_admin_only and not (user_openid and self._is_admin(user_openid)):
+            yield event.plain_result("❌ 一次查询多个服务器需要管理员权限！")
+            return
+        
+        async def query(target: Tuple[str, int]) -> tuple:
+            # 包一层元组，区分离线（None）与未在截止时间内完成（gather_bounded返回的None）
+            return (await self.query_exact_port(*target),)
+        
+        started = time.monotonic()
+        try:
+            results = await gather_bounded(targets, query, self.bulk_concurrency, self.bulk_deadline)
+        except Exception as e:
+            logger.error(f"批量查询服务器时出错: {e}")
+            yield event.plain_result(f"❌ 查询失败: {str(e)}")
+            return
+        elapsed = int((time.monotonic() - started) * 1000)
+        
+        # 排序键：在线在前（人数多的在前），其次是离线，最后是未完成的
+        rows = []
+        for (ip, port), result in zip(targets, results):
+            server_info = result[0] if isinstance(result, tuple) else None
+            if isinstance(server_info, dict) and server_info.get('online'):
+                players = server_info.get('players', 0)
+                players = players if isinstance(players, int) else 0
+                name = str(server_info.get('name') or '')[:20]
+                line = (f"🟢 {ip}:{port} {players}/{server_info.get('max_players', 'N/A')}"
+                        f" {server_info.get('ping', 'N/A')}ms {name}")
+                rows.append(((0, -players), line.rstrip()))
+            elif result is None:
+                rows.append(((2, 0), f"⏱️ {ip}:{port} 未在截止时间内完成"))
+            elif isinstance(result, Exception):
+                logger.error(f"查询{ip}:{port}时出错: {result}")
+                rows.append(((1, 0), f"🔴 {ip}:{port} 查询失败"))
+            else:
+                rows.append(((1, 0), f"🔴 {ip}:{port} {self._offline_status(ip, port)}"))
+        rows.sort(key=lambda row: row[0])
+        
+        online = [key for key, _ in rows if key[0] == 0]
+        lines = [
+            f"🎮 批量查询 {len(targets)} 个服务器: 🟢 {len(online)} 在线 | "
+            f"👥 {-sum(key[1] for key in online)} 人 | ⏱️ {elapsed}ms",
+            "",
+        ]
+        lines.extend(line for _, line in rows)
+        yield event.plain_result("\n".join(lines))
+    
     @filter.command("servers")
     async def list_servers(self, event: AstrMessageEvent):
         """显示预设服务器列表"""
-        server_list = """🎮 SCP:SL 服务器列表
-
-🌸 椿雨服务器:
-• 椿雨纯净服#1: 43.139.108.159:8000
-• 椿雨纯净服#2: 43.139.108.159:8001
-• 椿雨插件服#1: 43.139.108.159:8002
-• 椿雨插件服#2: 43.139.108.159:8003
-• 椿雨萌新服: 43.139.108.159:7777
-
-📝 使用方法:
-• /xy - 查询所有椿雨服务器状态
-• /cx <IP:端口> - 查询自定义服务器"""
-        yield event.plain_result(server_list)
+        self.registry.refresh()
+        yield event.plain_result(self.registry.servers_text)
     
     @filter.command("xy")
     async def query_chunyu_servers(self, event: AstrMessageEvent):
-        """查询所有椿雨服务器状态"""
-        servers = [
-            ("43.139.108.159",8000, "椿雨纯净服#1"),
-            ("43.139.108.159",8001, "椿雨纯净服#2"),
-            ("43.139.108.159",8002, "椿雨插件服#1"),
-            ("43.139.108.159",8003, "椿雨插件服#2"),
-            ("43.139.108.159",7777, "椿雨萌新服"),
-            ("8.138.236.97", 5000, "银狼服务器")
-        ]
+        """查询所有预设服务器状态"""
+        self.registry.refresh()
+        registry = self.registry
         
         response = "服务器状态总览\n"
         online_count = 0
         total_players = 0
         
-        for ip, port, name in servers:
-            try:
-                server_info = await self.query_scpsl_server(ip, port)
-                if server_info and server_info.get('status') != 'offline':
-                    online_count += 1
-                    players = server_info.get('players', 0)
-                    max_players = server_info.get('max_players', 0)
-                    total_players += players if isinstance(players, int) else 0
-                    
-                    response += f"{name} [{players}/{max_players}]\n"
-                else:
-                    response += f"{name} [离线]\n"
-            except Exception as e:
-                logger.error(f"查询{name}时出错: {e}")
-                response += f"{name} [查询失败]\n"
+        results = iter(await self.query_scpsl_servers(registry.servers))
+        # 分组标题和服务器名称在加载配置时已生成，这里只填入状态
+        for text, server in registry.overview_layout:
+            response += text
+            if server is None:
+                continue
+            ip, port, name, _ = server
+            server_info = next(results)
+            if isinstance(server_info, Exception):
+                logger.error(f"查询{name}时出错: {server_info}")
+                response += "查询失败]\n"
+            elif server_info and server_info.get('status') != 'offline':
+                online_count += 1
+                players = server_info.get('players', 0)
+                max_players = server_info.get('max_players', 0)
+                total_players += players if isinstance(players, int) else 0
+                
+                response += f"{players}/{max_players}]\n"
+            else:
+                response += f"{self._offline_status(ip, port)}]\n"
         
-        response += f"总计: {online_count}/{len(servers)} 台服务器在线\n"
+        response += f"总计: {online_count}/{len(registry)} 台服务器在线\n"
         response += f"总在线人数: {total_players} 人"
         
         yield event.plain_result(response)
@@ -142,287 +334,291 @@ class SCPSLServerQuery(Star):
                 response += f"🔄 状态: {'🟢 在线' if server_info.get('online') else '🔴 离线'}"
                 yield event.plain_result(response)
             else:
-                yield event.plain_result(f"❌ 无法连接到 {server_name} ({ip}:{port})\n请检查服务器是否在线！")
+                yield event.plain_result(f"❌ 无法连接到 {server_name} ({ip}:{port})\n🔄 状态: 🔴 {self._offline_status(ip, port)}")
         except Exception as e:
             logger.error(f"查询{server_name}时出错: {e}")
             yield event.plain_result(f"❌ 查询{server_name}失败: {str(e)}")
     
-    @filter.regex(r".*炸了\?.*|.*服务器炸了\?.*")
+    @filter.event_message_type(filter.EventMessageType.ALL)
     async def auto_check_server(self, event: AstrMessageEvent):
         """自动检测包含'炸了?'的消息并返回服务器状态"""
-        # 检查所有椿雨服务器的状态
-        servers = [
-            ("43.139.108.159", 8000, "椿雨纯净服#1"),
-            ("43.139.108.159", 8001, "椿雨纯净服#2"),
-            ("43.139.108.159", 8002, "椿雨插件服#1"),
-            ("43.139.108.159", 8003, "椿雨插件服#2"),
-            ("43.139.108.159", 7777, "椿雨萌新服")
-        ]
+        # 每条消息都会经过这里，不含关键词时立即返回
+        if not self.trigger.search(event.message_str):
+            return
         
-        response = "🤖 自动检测椿雨服务器状态\n\n"
+        group_id = getattr(event, 'group_id', None) or getattr(event, 'session_id', 'private')
+        try:
+            self.registry.refresh()
+            # 配置重新加载后version变化，不再复用旧配置生成的回复
+            key = (str(group_id), self.registry.version)
+            response = await self.trigger_replies.get(key, self._render_auto_check)
+            yield event.plain_result(response)
+        except Exception as e:
+            logger.error(f"自动检测服务器状态时出错: {e}")
+    
+    async def _render_auto_check(self) -> str:
+        """检查所有预设服务器的状态并生成自动检测回复"""
+        servers = self.registry.servers
+        
+        response = "🤖 自动检测服务器状态\n\n"
         online_count = 0
         
-        for ip, port, name in servers:
-            try:
-                server_info = await self.query_scpsl_server(ip, port)
-                if server_info and server_info.get('online'):
-                    status = "🟢 在线"
-                    players = f"{server_info.get('players', 'N/A')}/{server_info.get('max_players', 'N/A')}"
-                    ping = f"{server_info.get('ping', 'N/A')}ms"
-                    online_count += 1
-                else:
-                    status = "🔴 离线"
-                    players = "N/A"
-                    ping = "N/A"
-                
-                response += f"• {name}: {status} | 👥{players} | 🌐{ping}\n"
-            except:
-                response += f"• {name}: 🔴 离线 | 👥N/A | 🌐N/A\n"
+        results = await self.query_scpsl_servers(servers)
+        for (ip, port, name, _), server_info in zip(servers, results):
+            if isinstance(server_info, dict) and server_info.get('online'):
+                status = "🟢 在线"
+                players = f"{server_info.get('players', 'N/A')}/{server_info.get('max_players', 'N/A')}"
+                ping = f"{server_info.get('ping', 'N/A')}ms"
+                online_count += 1
+            else:
+                status = f"🔴 {self._offline_status(ip, port)}"
+                players = "N/A"
+                ping = "N/A"
+            
+            response += f"• {name}: {status} | 👥{players} | 🌐{ping}\n"
         
-        response += f"\n📊 总计: {online_count}/5 个椿雨服务器在线"
-        yield event.plain_result(response)
+        response += f"\n📊 总计: {online_count}/{len(servers)} 个服务器在线"
+        return response
+    
+    async def _query_a2s(self, query, ip: str, port: int, per_server: bool = True):
+        """
+        执行一次A2S查询（query为A2SClient的查询方法），失败时记录日志并返回None
+        per_server为False时只计入全局指标，不建立该地址的直方图
+        """
+        started = time.monotonic()
+        outcome = 'ok'
+        try:
+            return await query(ip, port, self.timeout)
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            logger.debug(f"查询超时: {ip}:{port}")
+        except A2SError as e:
+            outcome = 'parse_error'
+            logger.debug(f"响应解析失败 {ip}:{port}: {str(e)}")
+        except Exception as e:
+            outcome = 'error'
+            logger.debug(f"查询异常 {ip}:{port}: {str(e)}")
+        finally:
+            self.metrics.observe((ip, port) if per_server else None, outcome, time.monotonic() - started)
+        return None
+    
+    async def _query_server_info(self, ip: str, port: int) -> Optional[ServerInfo]:
+        """使用支持challenge的A2S协议查询服务器信息，失败返回None"""
+        # 同时探测游戏端口及相邻端口，并记住应答的查询端口
+        return await self._query_a2s(self.a2s.query_server, ip, port)
     
     async def _query_server_tcp(self, ip: str, port: int) -> Dict[str, Any]:
         """使用支持challenge的A2S协议查询服务器信息"""
-        # 尝试多个可能的查询端口
-        query_ports = [port, port + 1, port - 1]
+        info = await self._query_server_info(ip, port)
+        if info is not None:
+            return info.to_dict()
         
-        for query_port in query_ports:
-            sock = None
-            try:
-                # 创建UDP socket进行A2S查询
-                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                sock.settimeout(5.0)  # 增加超时时间以适应challenge机制
-                
-                start_time = time.time()
-                
-                # 第一次A2S_INFO查询
-                query = b"\xFF\xFF\xFF\xFF\x54Source Engine Query\x00"
-                sock.sendto(query, (ip, query_port))
-                
-                response, addr = sock.recvfrom(1400)
-                
-                if len(response) < 5:
-                    continue
-                
-                # 检查响应头
-                if response[:4] != b"\xFF\xFF\xFF\xFF":
-                    continue
-                
-                # 检查是否收到challenge响应
-                if response[4] == 0x41:  # S2C_CHALLENGE
-                    if len(response) >= 9:
-                        # 提取challenge值
-                        challenge = struct.unpack('<I', response[5:9])[0]
-                        
-                        # 重新发送带challenge的查询
-                        query_with_challenge = query + struct.pack('<I', challenge)
-                        sock.sendto(query_with_challenge, (ip, query_port))
-                        response, addr = sock.recvfrom(1400)
-                    else:
-                        # challenge响应格式错误
-                        continue
-                
-                ping = round((time.time() - start_time) * 1000)
-                
-                # 解析A2S_INFO响应
-                if len(response) >= 5 and response[4] == 0x49:  # A2S_INFO response
-                    result = self._parse_a2s_info(response[5:], ping)
-                    if result.get('status') == 'online':
-                        return result
-                
-            except socket.timeout:
-                logger.debug(f"查询超时: {ip}:{query_port}")
-                continue
-            except ConnectionRefusedError:
-                logger.debug(f"连接被拒绝: {ip}:{query_port}")
-                continue
-            except Exception as e:
-                logger.debug(f"查询异常 {ip}:{query_port}: {str(e)}")
-                continue
-            finally:
-                # 确保socket被正确关闭
-                if sock:
-                    try:
-                        sock.close()
-                    except:
-                        pass
-        
-        # 如果所有端口都失败，返回错误
+        # 所有候选端口都失败，返回错误
         return {'status': 'offline', 'error': '无法连接到服务器'}
     
-    def _parse_a2s_info(self, data: bytes, ping: int) -> Dict[str, Any]:
-         """解析A2S_INFO响应数据"""
-         try:
-             offset = 0
-             
-             # 协议版本
-             protocol = data[offset]
-             offset += 1
-             
-             # 服务器名称
-             server_name_end = data.find(b'\x00', offset)
-             server_name = data[offset:server_name_end].decode('utf-8', errors='ignore')
-             offset = server_name_end + 1
-             
-             # 地图名称
-             map_name_end = data.find(b'\x00', offset)
-             map_name = data[offset:map_name_end].decode('utf-8', errors='ignore')
-             offset = map_name_end + 1
-             
-             # 文件夹名称
-             folder_end = data.find(b'\x00', offset)
-             folder = data[offset:folder_end].decode('utf-8', errors='ignore')
-             offset = folder_end + 1
-             
-             # 游戏名称
-             game_end = data.find(b'\x00', offset)
-             game = data[offset:game_end].decode('utf-8', errors='ignore')
-             offset = game_end + 1
-             
-             # 应用ID
-             if offset + 2 <= len(data):
-                 app_id = struct.unpack('<H', data[offset:offset+2])[0]
-                 offset += 2
-             else:
-                 app_id = 0
-             
-             # 玩家数量
-             if offset < len(data):
-                 players = data[offset]
-                 offset += 1
-             else:
-                 players = 0
-             
-             # 最大玩家数
-             if offset < len(data):
-                 max_players = data[offset]
-                 offset += 1
-             else:
-                 max_players = 20
-             
-             # 机器人数量
-             if offset < len(data):
-                 bots = data[offset]
-                 offset += 1
-             else:
-                 bots = 0
-             
-             # 服务器类型
-             if offset < len(data):
-                 server_type = chr(data[offset])
-                 offset += 1
-             else:
-                 server_type = 'd'
-             
-             # 平台
-             if offset < len(data):
-                 platform = chr(data[offset])
-                 offset += 1
-             else:
-                 platform = 'l'
-             
-             # 是否需要密码
-             if offset < len(data):
-                 password = bool(data[offset])
-                 offset += 1
-             else:
-                 password = False
-             
-             # VAC状态
-             if offset < len(data):
-                 vac = bool(data[offset])
-                 offset += 1
-             else:
-                 vac = False
-             
-             return {
-                 'status': 'online',
-                 'players': players,
-                 'max_players': max_players,
-                 'server_name': server_name,
-                 'map': map_name,
-                 'game_mode': game if game else '未知模式',
-                 'round_time': '未知',
-                 'ping': ping,
-                 'bots': bots,
-                 'password': password,
-                 'vac': vac
-             }
-             
-         except Exception as e:
-             return {
-                 'status': 'error',
-                 'error': f'解析A2S响应失败: {str(e)}'
-             }
-     
+    def _start_background(self):
+        """启动后台轮询、人数历史汇总和指标导出；插件加载时若没有运行中的事件循环，在第一次查询时启动"""
+        self.poller.start()
+        self.compactor.start()
+        self.metrics_exporter.start()
+    
     async def query_scpsl_server(self, ip: str, port: int) -> dict:
-        """查询SCP:SL服务器信息（使用A2S协议）"""
-        # 直接使用A2S协议查询
-        result = await self._query_server_tcp(ip, port)
-        
-        if result and result.get('status') == 'online':
-            # 转换为兼容格式
-            return {
-                'online': True,
-                'ping': result.get('ping', 0),
-                'players': result.get('players', 0),
-                'max_players': result.get('max_players', 20),
-                'name': result.get('server_name', 'SCP:SL Server'),
-                'gamemode': result.get('game_mode', 'Classic'),
-                'map': result.get('map', 'Facility'),
-                'round_time': result.get('round_time', '00:00'),
-                'version': 'Unknown'
-            }
-        else:
+        """查询SCP:SL服务器信息（使用A2S协议），同一服务器的结果会被缓存并合并并发查询"""
+        self._start_background()
+        return await self.status_cache.get((ip, port), lambda: self._fetch_scpsl_server(ip, port))
+    
+    async def query_exact_port(self, ip: str, port: int) -> Optional[dict]:
+        """
+        批量查询使用：只查询port本身，不探测相邻端口，否则扫描端口范围时
+        服务器旁边的空端口也会显示为在线；结果单独缓存，不与按游戏端口查询的结果混用
+        扫描的多是空端口，不经过熔断，也不记入人数历史和按服务器的指标，
+        以免挤掉预设服务器和群聊绑定服务器的记录
+        """
+        self._start_background()
+        return await self.status_cache.get((ip, port, 'exact'), lambda: self._fetch_exact_port(ip, port))
+    
+    async def _fetch_exact_port(self, ip: str, port: int) -> Optional[dict]:
+        query = partial(self.a2s.query_server, probe_neighbours=False)
+        info = await self._query_a2s(query, ip, port, per_server=False)
+        if info is None:
+            return None
+        return self._to_compat_dict(info)
+    
+    async def _fetch_scpsl_server(self, ip: str, port: int) -> Optional[dict]:
+        """实际发起A2S查询并转换为兼容格式"""
+        if self._short_circuit(ip, port):
+            return None
+        info = await self._query_server_info(ip, port)
+        self.breaker.record((ip, port), info is not None)
+        self._record_sample(ip, port, info)
+        if info is None:
+            return None
+        return self._to_compat_dict(info)
+    
+    async def query_scpsl_server_details(self, ip: str, port: int) -> Optional[dict]:
+        """
+        查询服务器详细信息，在query_scpsl_server的结果之外
+        增加 player_list: [(玩家名, 在线秒数)] 和 rules: {规则名: 值}
+        A2S_INFO/PLAYER/RULES三个请求同时发出，结果同样会被缓存
+        """
+        self._start_background()
+        return await self.status_cache.get((ip, port, 'details'), lambda: self._fetch_scpsl_details(ip, port))
+    
+    async def _fetch_scpsl_details(self, ip: str, port: int) -> Optional[dict]:
+        if self._short_circuit(ip, port):
             return None
+        details = await self._query_a2s(self.a2s.query_details, ip, port)
+        self.breaker.record((ip, port), details is not None)
+        self._record_sample(ip, port, details.info if details else None)
+        if details is None:
+            return None
+        
+        # 顺便刷新基础状态缓存
+        self.status_cache.put((ip, port), self._to_compat_dict(details.info))
+        
+        result = self._to_compat_dict(details.info, details.round_time or '未知')
+        result['player_list'] = [(player.name, player.duration) for player in details.players]
+        result['rules'] = details.rules
+        return result
+    
+    def _short_circuit(self, ip: str, port: int) -> bool:
+        """服务器处于熔断状态时返回True；到达重试时间时顺便在后台发起一次探测"""
+        if self.breaker.allow((ip, port)):
+            return False
+        if self.breaker.take_probe((ip, port)):
+            task = asyncio.ensure_future(self._probe_server(ip, port))
+            self._probe_tasks.add(task)
+            task.add_done_callback(self._probe_tasks.discard)
+        else:
+            # 跳过的查询同样记一个离线样本（探测会记录自己的结果），
+            # 否则熔断期间的离线样本远少于在线样本，在线率会被高估
+            self._record_sample(ip, port, None)
+        return True
+    
+    async def _probe_server(self, ip: str, port: int):
+        """熔断到期后的探测：成功则恢复并更新缓存，失败则继续熔断"""
+        info = None
+        try:
+            info = await self._query_server_info(ip, port)
+        finally:
+            self.breaker.record((ip, port), info is not None)
+        self._record_sample(ip, port, info)
+        if info is not None:
+            self.status_cache.put((ip, port), self._to_compat_dict(info))
+            self.status_cache.invalidate((ip, port, 'details'))
+            logger.info(f"服务器 {ip}:{port} 已恢复在线")
+    
+    def _cached_status(self, ip: str, port: int) -> str:
+        """只读取缓存（后台轮询维护）的状态文字，不发起查询"""
+        cached = self.status_cache.peek((ip, port))
+        if cached is None:
+            return "未检测"
+        server_info = cached[0]
+        if server_info and server_info.get('online'):
+            return f"🟢 {server_info.get('players', 'N/A')}/{server_info.get('max_players', 'N/A')}"
+        return f"🔴 {self._offline_status(ip, port)}"
+    
+    def _offline_status(self, ip: str, port: int) -> str:
+        """离线状态文字，有失败记录时附带最近一次实际检测的时间"""
+        checked_ago = self.breaker.checked_ago((ip, port))
+        if checked_ago is None:
+            return "离线"
+        return f"离线 (最近检测 {int(checked_ago)} 秒前)"
+    
+    def _record_sample(self, ip: str, port: int, info: Optional[ServerInfo]):
+        """把一次实际查询的结果记入人数历史（内存并延迟写入数据库）"""
+        now = time.time()
+        players, ping = (OFFLINE, OFFLINE) if info is None else (info.players, info.ping)
+        self.history.record((ip, port), players, ping, now)
+        self.sample_writer.add((ip, port), now, players, ping)
+    
+    def _to_compat_dict(self, info: ServerInfo, round_time: str = '未知') -> dict:
+        """把A2S_INFO结果转换为兼容格式"""
+        return {
+            'online': True,
+            'ping': info.ping,
+            'players': info.players,
+            'max_players': info.max_players,
+            'name': info.name,
+            'gamemode': info.game or '未知模式',
+            'map': info.map,
+            'round_time': round_time,
+            'version': 'Unknown'
+        }
+    
+    async def _refresh_server_status(self, ip: str, port: int) -> Optional[dict]:
+        """强制刷新一个服务器的缓存状态（供后台轮询使用）"""
+        return await self.status_cache.refresh((ip, port), lambda: self._fetch_scpsl_server(ip, port))
+    
+    async def _get_poll_targets(self) -> List[Tuple[str, int]]:
+        """后台轮询的地址：预设服务器加上所有群聊绑定的服务器"""
+        self.registry.refresh()
+        return self.registry.addresses + self.bindings.addresses()
+    
+    async def query_scpsl_servers(self, servers: List[Tuple[str, int, str]]) -> List[Any]:
+        """
+        并发查询多个服务器 (ip, port, name)
+        结果顺序与传入顺序一致，每项为query_scpsl_server的返回值；
+        查询抛出异常的位置为异常对象，超过总截止时间的位置为None
+        """
+        return await gather_bounded(
+            servers,
+            lambda server: self.query_scpsl_server(server[0], server[1]),
+            self.batch_concurrency,
+            self.batch_deadline,
+        )
     
     async def query_scpsl_server_udp(self, ip: str, port: int) -> dict:
         """UDP查询服务器信息（使用A2S协议）"""
         # 直接调用TCP方法，因为它实际上使用的是UDP A2S协议
         return await self._query_server_tcp(ip, port)
     
+    def _register_metrics(self):
+        """把各组件维护的计数器和瞬时值注册到查询指标中"""
+        cache = self.status_cache
+        collectors = [
+            ('cache_hits_total', '缓存新鲜命中次数', 'counter', lambda: cache.hits),
+            ('cache_stale_hits_total', '缓存过期命中次数（同时后台刷新）', 'counter', lambda: cache.stale_hits),
+            ('cache_misses_total', '缓存未命中次数', 'counter', lambda: cache.misses),
+            ('cache_hit_ratio', '缓存命中率', 'gauge', lambda: round(cache.hit_ratio, 4)),
+            ('cache_inflight', '缓存中进行中的查询数', 'gauge', lambda: cache.inflight),
+            ('breaker_open', '处于熔断状态的服务器数', 'gauge', lambda: self.breaker.open_count),
+            ('breaker_short_circuits_total', '因熔断而跳过的查询数', 'counter', lambda: self.breaker.short_circuited),
+            ('a2s_inflight', '正在等待回复的A2S请求数', 'gauge', lambda: self.a2s.in_flight),
+            ('a2s_retransmits_total', '超过RTO后重发的A2S请求数', 'counter', lambda: self.a2s.retransmits),
+            ('a2s_challenges_total', '收到的challenge响应数', 'counter', lambda: self.a2s.challenges_received),
+            ('a2s_dropped_packets_total', '丢弃的无主数据包数', 'counter', lambda: self.a2s.dropped_packets),
+            ('a2s_split_dropped_total', '丢弃的分包数', 'counter', lambda: self.a2s.reassembler.dropped),
+            ('dns_cache_hits_total', '主机名解析缓存命中次数', 'counter', lambda: self.resolver.hits),
+            ('dns_lookups_total', '实际发起的主机名解析次数', 'counter', lambda: self.resolver.lookups),
+            ('dns_failures_total', '主机名解析失败次数', 'counter', lambda: self.resolver.failures),
+        ]
+        for name, help_text, kind, read in collectors:
+            self.metrics.add_collector(name, help_text, kind, read)
+    
     def _init_database(self):
         """初始化数据库"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS group_servers (
-                    group_id TEXT PRIMARY KEY,
-                    server_ip TEXT NOT NULL,
-                    server_port INTEGER DEFAULT 7777,
-                    server_name TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS admin_users (
-                    openid TEXT PRIMARY KEY,
-                    username TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_by TEXT
-                )
-            ''')
-            conn.commit()
-            conn.close()
+            self.storage.open_sync()
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
     
     def _init_admin_system(self):
         """初始化管理员系统"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT openid FROM admin_users')
-            results = cursor.fetchall()
-            self.admin_openids = {row[0] for row in results}
-            conn.close()
+            self.admin_openids = set(self.storage.load_admin_openids_sync())
             logger.info(f"已加载 {len(self.admin_openids)} 个管理员")
         except Exception as e:
             logger.error(f"管理员系统初始化失败: {e}")
     
+    def _init_bindings(self):
+        """加载群聊绑定索引"""
+        try:
+            self.bindings.load(self.storage.load_group_servers_sync())
+            logger.info(f"已加载 {len(self.bindings)} 个群聊绑定")
+        except Exception as e:
+            logger.error(f"群聊绑定加载失败: {e}")
+    
     def _is_admin(self, openid: str) -> bool:
         """检查用户是否为管理员"""
         return openid in self.admin_openids
@@ -441,31 +637,20 @@ class SCPSLServerQuery(Star):
         
         return None
     
-    def _add_admin(self, openid: str, username: str = None, created_by: str = None) -> bool:
+    async def _add_admin(self, openid: str, username: str = None, created_by: str = None) -> bool:
         """添加管理员"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO admin_users (openid, username, created_by)
-                VALUES (?, ?, ?)
-            ''', (openid, username, created_by))
-            conn.commit()
-            conn.close()
+            await self.storage.add_admin(openid, username, created_by)
             self.admin_openids.add(openid)
             return True
         except Exception as e:
             logger.error(f"添加管理员失败: {e}")
             return False
     
-    def _remove_admin(self, openid: str) -> bool:
+    async def _remove_admin(self, openid: str) -> bool:
         """移除管理员"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM admin_users WHERE openid = ?', (openid,))
-            conn.commit()
-            conn.close()
+            await self.storage.remove_admin(openid)
             
             # 从内存中移除
             self.admin_openids.discard(openid)
@@ -475,57 +660,26 @@ class SCPSLServerQuery(Star):
             return False
     
     def _ensure_admin_exists(self, openid: str, username: str = "系统管理员"):
-        """确保指定的管理员存在于数据库中"""
+        """确保指定的管理员存在于数据库中（插件加载时调用）"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 检查是否已存在
-            cursor.execute('SELECT openid FROM admin_users WHERE openid = ?', (openid,))
-            if cursor.fetchone():
-                conn.close()
-                return
-            
-            # 添加到数据库
-            cursor.execute(
-                'INSERT INTO admin_users (openid, username, created_at, created_by) VALUES (?, ?, ?, ?)',
-                (openid, username, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'system')
-            )
-            conn.commit()
-            conn.close()
+            if self.storage.ensure_admin_sync(openid, username):
+                logger.info(f"系统管理员已添加: {openid}")
             
             # 添加到内存
             self.admin_openids.add(openid)
-            logger.info(f"系统管理员已添加: {openid}")
             
         except Exception as e:
             logger.error(f"添加系统管理员失败: {e}")
     
     def _get_group_server(self, group_id: str) -> Optional[Tuple[str, int, str]]:
         """获取群聊绑定的服务器信息"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT server_ip, server_port, server_name FROM group_servers WHERE group_id = ?', (group_id,))
-            result = cursor.fetchone()
-            conn.close()
-            return result
-        except Exception as e:
-            logger.error(f"查询群聊服务器失败: {e}")
-            return None
+        return self.bindings.get(group_id)
     
-    def _set_group_server(self, group_id: str, server_ip: str, server_port: int = 7777, server_name: str = None) -> bool:
+    async def _set_group_server(self, group_id: str, server_ip: str, server_port: int = 7777, server_name: str = None) -> bool:
         """设置群聊绑定的服务器"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO group_servers 
-                (group_id, server_ip, server_port, server_name, updated_at) 
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (group_id, server_ip, server_port, server_name))
-            conn.commit()
-            conn.close()
+            await self.storage.set_group_server(group_id, server_ip, server_port, server_name)
+            self.bindings.set(group_id, server_ip, server_port, server_name)
             return True
         except Exception as e:
             logger.error(f"设置群聊服务器失败: {e}")
@@ -580,26 +734,48 @@ class SCPSLServerQuery(Star):
     
     @filter.command("groups")
     async def list_all_groups(self, event: AstrMessageEvent):
-        """列出所有已绑定服务器的群聊"""
+        """分页列出已绑定服务器的群聊：/groups [IP[:端口]] [页码]"""
+        args = event.message_str.strip().split()[1:]
+        page = 1
+        if args and args[-1].isdigit():
+            page = max(1, int(args.pop()))
+        server_ip, server_port = None, None
+        if args:
+            server_ip, _, port_str = args[0].partition(':')
+            if port_str:
+                try:
+                    server_port = int(port_str)
+                except ValueError:
+                    yield event.plain_result(f"❌ 无效的端口号: {port_str}")
+                    return
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT group_id, server_ip, server_port, server_name, created_at FROM group_servers ORDER BY created_at DESC')
-            results = cursor.fetchall()
-            conn.close()
+            # 总数取自内存索引，不需要扫描整张表
+            total = self.bindings.count(server_ip, server_port)
+            address_filter = f" ({args[0]})" if server_ip else ""
+            if not total:
+                yield event.plain_result(f"📋 暂无群聊绑定服务器{address_filter}")
+                return
             
+            pages = (total + self.groups_page_size - 1) // self.groups_page_size
+            results = await self.storage.list_group_servers_page(page, self.groups_page_size, server_ip, server_port)
             if not results:
-                yield event.plain_result("📋 暂无群聊绑定服务器")
+                yield event.plain_result(f"❌ 没有第{page}页，共{pages}页")
                 return
             
-            response = "📋 已绑定服务器的群聊列表\n\n"
-            for i, (gid, ip, port, name, created_at) in enumerate(results, 1):
-                response += f"{i}. 群聊ID: {gid}\n"
-                response += f"   服务器: {name or f'{ip}:{port}'}\n"
-                response += f"   地址: {ip}:{port}\n"
-                response += f"   绑定时间: {created_at[:19]}\n\n"
+            lines = [f"📋 已绑定服务器的群聊列表{address_filter} 第{page}/{pages}页 (共{total}个)", ""]
+            first = (page - 1) * self.groups_page_size + 1
+            for i, (gid, ip, port, name, created_at) in enumerate(results, first):
+                lines.append(f"{i}. 群聊ID: {gid}")
+                lines.append(f"   服务器: {name or f'{ip}:{port}'} [{self._cached_status(ip, port)}]")
+                lines.append(f"   地址: {ip}:{port}")
+                lines.append(f"   绑定时间: {str(created_at)[:19]}")
+            if page < pages:
+                next_args = f"{args[0]} " if server_ip else ""
+                lines.append("")
+                lines.append(f"➡️ 下一页: /groups {next_args}{page + 1}")
             
-            yield event.plain_result(response)
+            yield event.plain_result("\n".join(lines))
         except Exception as e:
             logger.error(f"查询群聊列表失败: {e}")
             yield event.plain_result(f"❌ 查询失败: {str(e)}")
@@ -623,20 +799,14 @@ class SCPSLServerQuery(Star):
         # 如果只有/unbind命令，解绑当前群聊
         if len(message_parts) == 1:
             try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute('SELECT server_name, server_ip, server_port FROM group_servers WHERE group_id = ?', (current_group_id,))
-                result = cursor.fetchone()
+                result = await self.storage.delete_group_server(current_group_id)
+                self.bindings.remove(current_group_id)
                 
                 if not result:
                     yield event.plain_result(f"❌ 当前群聊(OpenID: {current_group_id})没有绑定服务器！")
-                    conn.close()
                     return
                 
                 server_name, server_ip, server_port = result
-                cursor.execute('DELETE FROM group_servers WHERE group_id = ?', (current_group_id,))
-                conn.commit()
-                conn.close()
                 
                 response = f"✅ 成功解绑当前群聊的服务器！\n"
                 response += f"🆔 群聊OpenID: {current_group_id}\n"
@@ -657,20 +827,14 @@ class SCPSLServerQuery(Star):
             return
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('SELECT server_name, server_ip, server_port FROM group_servers WHERE group_id = ?', (target_group_id,))
-            result = cursor.fetchone()
+            result = await self.storage.delete_group_server(target_group_id)
+            self.bindings.remove(target_group_id)
             
             if not result:
                 yield event.plain_result(f"❌ 群聊(OpenID: {target_group_id})没有绑定服务器！")
-                conn.close()
                 return
             
             server_name, server_ip, server_port = result
-            cursor.execute('DELETE FROM group_servers WHERE group_id = ?', (target_group_id,))
-            conn.commit()
-            conn.close()
             
             if target_group_id == current_group_id:
                 response = f"✅ 成功解绑当前群聊的服务器！\n"
@@ -706,7 +870,7 @@ class SCPSLServerQuery(Star):
                 return
             
             if message_parts[1] == "init":
-                if self._add_admin(user_openid, "初始管理员", "系统初始化"):
+                if await self._add_admin(user_openid, "初始管理员", "系统初始化"):
                     yield event.plain_result(f"✅ 恭喜！您已成为系统管理员\n🆔 管理员OpenID: {user_openid}")
                 else:
                     yield event.plain_result("❌ 初始化管理员失败！")
@@ -734,11 +898,7 @@ class SCPSLServerQuery(Star):
         if command == "list":
             # 查看管理员列表
             try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute('SELECT openid, username, created_at, created_by FROM admin_users ORDER BY created_at')
-                results = cursor.fetchall()
-                conn.close()
+                results = await self.storage.list_admins()
                 
                 if not results:
                     yield event.plain_result("📋 暂无管理员")
@@ -769,7 +929,7 @@ class SCPSLServerQuery(Star):
                 yield event.plain_result(f"❌ OpenID {target_openid} 已经是管理员！")
                 return
             
-            if self._add_admin(target_openid, username, user_openid):
+            if await self._add_admin(target_openid, username, user_openid):
                 response = f"✅ 成功添加管理员！\n"
                 response += f"🆔 OpenID: {target_openid}\n"
                 response += f"👤 用户名: {username or '未设置'}\n"
@@ -794,7 +954,7 @@ class SCPSLServerQuery(Star):
                 yield event.plain_result(f"❌ OpenID {target_openid} 不是管理员！")
                 return
             
-            if self._remove_admin(target_openid):
+            if await self._remove_admin(target_openid):
                 yield event.plain_result(f"✅ 成功移除管理员: {target_openid}")
             else:
                 yield event.plain_result("❌ 移除管理员失败！")
@@ -840,7 +1000,7 @@ class SCPSLServerQuery(Star):
                     response += f"🔄 状态: 🟢 在线"
                     yield event.plain_result(response)
                 else:
-                    yield event.plain_result(f"❌ 无法连接到群聊服务器 {server_ip}:{server_port}\n🔄 状态: 🔴 离线")
+                    yield event.plain_result(f"❌ 无法连接到群聊服务器 {server_ip}:{server_port}\n🔄 状态: 🔴 {self._offline_status(server_ip, server_port)}")
             except Exception as e:
                 yield event.plain_result(f"❌ 查询群聊服务器时出错: {str(e)}")
             return
@@ -878,7 +1038,7 @@ class SCPSLServerQuery(Star):
             yield event.plain_result(f"⚠️ 警告: 测试连接时出错 ({str(e)})，但仍会保存设置")
         
         # 保存到数据库
-        if self._set_group_server(group_id, server_ip, server_port, server_name):
+        if await self._set_group_server(group_id, server_ip, server_port, server_name):
             response = f"✅ 群聊服务器设置成功！\n"
             response += f"🆔 群聊OpenID: {group_id}\n"
             response += f"🏷️ 服务器: {server_name or f'{server_ip}:{server_port}'}\n"
@@ -887,6 +1047,115 @@ class SCPSLServerQuery(Star):
         else:
             yield event.plain_result("❌ 设置群聊服务器失败，请稍后重试")
     
+    @filter.command("trend")
+    async def show_player_trend(self, event: AstrMessageEvent):
+        """显示服务器最近一段时间的人数趋势"""
+        message_parts = event.message_str.strip().split()
+        args = message_parts[1:]
+        
+        # 最后一个参数为纯数字时视为小时数
+        hours = self.trend_hours
+        if args and args[-1].replace('.', '', 1).isdigit():
+            hours = float(args.pop())
+            if hours <= 0:
+                yield event.plain_result("❌ 小时数必须大于0！")
+                return
+        
+        target = self._resolve_trend_target(event, args)
+        if target is None:
+            yield event.plain_result("❌ 未找到要统计的服务器！\n使用方法: /trend [服务器名|IP:端口] [小时数]\n在已绑定服务器的群聊中可省略服务器")
+            return
+        
+        ip, port, label = target
+        seconds = hours * 3600
+        # 内存中的样本覆盖整个时间段时直接使用，否则读取数据库中的历史（长时间段自动使用汇总表）
+        oldest = self.history.oldest((ip, port))
+        if oldest is not None and oldest <= time.time() - seconds:
+            summary = self.history.summarize((ip, port), seconds)
+        else:
+            try:
+                summary = await self.compactor.summarize((ip, port), seconds)
+            except Exception as e:
+                logger.error(f"读取人数历史失败: {e}")
+                summary = None
+            if summary is None:
+                summary = self.history.summarize((ip, port), seconds)
+        if summary is None:
+            yield event.plain_result(f"📈 {label} 最近{hours:g}小时暂无记录\n💡 查询过的服务器和预设服务器才会记录人数")
+            return
+        
+        response = f"📈 {label} 最近{hours:g}小时人数趋势\n"
+        response += f"👥 最低/平均/最高: {summary.min_players} / {summary.avg_players:.1f} / {summary.max_players}\n"
+        response += f"🟢 在线率: {summary.availability * 100:.1f}%\n"
+        response += f"📊 {summary.sparkline}\n"
+        response += f"🔢 样本数: {summary.samples}"
+        yield event.plain_result(response)
+    
+    def _resolve_trend_target(self, event: AstrMessageEvent, args: List[str]) -> Optional[Tuple[str, int, str]]:
+        """把/trend的参数解析为 (ip, port, 显示名称)"""
+        if not args:
+            group_id = getattr(event, 'group_id', None) or getattr(event, 'session_id', 'private')
+            binding = self._get_group_server(str(group_id)) if group_id and group_id != 'private' else None
+            if binding is None:
+                return None
+            ip, port, name = binding
+            return ip, port, name or f"{ip}:{port}"
+        
+        query = ' '.join(args)
+        preset = self.registry.find(query)
+        if preset is not None:
+            return preset.ip, preset.port, preset.name
+        
+        ip, _, port_str = query.partition(':')
+        try:
+            port = int(port_str) if port_str else self.default_port
+        except ValueError:
+            return None
+        if not ip or ' ' in ip or not (1 <= port <= 65535):
+            return None
+        return ip, port, f"{ip}:{port}"
+    
+    @filter.command("scpsl_stats")
+    async def show_query_stats(self, event: AstrMessageEvent):
+        """查看查询延迟、结果计数和缓存命中率（仅管理员）"""
+        user_openid = self._get_user_openid(event)
+        if not user_openid or not self._is_admin(user_openid):
+            yield event.plain_result("❌ 您没有管理员权限！")
+            return
+        
+        try:
+            metrics = self.metrics
+            latency = metrics.latency
+            outcomes = metrics.outcomes
+            values = metrics.collect()
+            uptime = int(time.time() - metrics.started)
+            
+            response = f"📊 SCP:SL 查询统计 (运行 {uptime // 3600}小时{uptime % 3600 // 60}分钟)\n\n"
+            response += f"🔎 实际查询: {latency.count} 次\n"
+            response += (f"⏱️ 延迟: 平均 {latency.mean * 1000:.0f}ms | p50 {latency.quantile(0.5) * 1000:.0f}ms"
+                         f" | p95 {latency.quantile(0.95) * 1000:.0f}ms | p99 {latency.quantile(0.99) * 1000:.0f}ms\n")
+            response += (f"📈 结果: 成功 {outcomes['ok']} | 超时 {outcomes['timeout']}"
+                         f" | 解析错误 {outcomes['parse_error']} | 其他 {outcomes['error']}\n")
+            response += f"🔑 Challenge: {values.get('a2s_challenges_total', 0)} 次\n"
+            response += (f"🧭 域名解析: 缓存命中 {values.get('dns_cache_hits_total', 0)}"
+                         f" | 实际解析 {values.get('dns_lookups_total', 0)} | 失败 {values.get('dns_failures_total', 0)}\n")
+            response += (f"💾 缓存: 命中率 {values.get('cache_hit_ratio', 0) * 100:.1f}%"
+                         f" (新鲜 {values.get('cache_hits_total', 0)} | 过期 {values.get('cache_stale_hits_total', 0)}"
+                         f" | 未命中 {values.get('cache_misses_total', 0)})\n")
+            response += f"🔄 进行中: 查询 {values.get('cache_inflight', 0)} | A2S请求 {values.get('a2s_inflight', 0)}\n"
+            
+            slowest = [(address, h) for address, h in metrics.slowest(5) if h.count]
+            if slowest:
+                response += "\n🐢 最慢的服务器 (p95):\n"
+                for (ip, port), histogram in slowest:
+                    failures = metrics.server_failures.get((ip, port), 0)
+                    response += (f"• {ip}:{port} - {histogram.quantile(0.95) * 1000:.0f}ms"
+                                 f" ({histogram.count}次, 失败{failures}次)\n")
+            yield event.plain_result(response.rstrip())
+        except Exception as e:
+            logger.error(f"获取查询统计失败: {e}")
+            yield event.plain_result(f"❌ 获取统计失败: {str(e)}")
+    
     @filter.command("scpsl_help")
     async def show_help(self, event: AstrMessageEvent):
         """显示插件帮助信息"""
@@ -894,14 +1163,17 @@ class SCPSLServerQuery(Star):
 
 📋 可用命令:
 • /servers - 显示预设服务器列表
-• /xy - 查询所有椿雨服务器状态总览
+• /xy - 查询所有预设服务器状态总览
 • /cx <IP> [端口] - 查询自定义服务器状态
+• /cx <IP:端口|IP:端口-端口|网段> ... - 批量查询多个服务器(仅管理员)
 • /zc [IP] [端口] [名称] - 群聊服务器管理
 • /openid - 获取当前群聊的OpenID
 • /myid - 获取当前用户的OpenID
-• /groups - 列出所有已绑定服务器的群聊
+• /groups [IP[:端口]] [页码] - 分页列出已绑定服务器的群聊
 • /unbind [群聊ID] - 解绑服务器(无参数解绑当前群聊)
 • /admin <子命令> - 管理员系统
+• /trend [服务器名|IP:端口] [小时数] - 查看人数趋势
+• /scpsl_stats - 查看查询统计(仅管理员)
 • /scpsl_help - 显示此帮助信息
 
 👑 管理员命令:
@@ -912,27 +1184,31 @@ class SCPSLServerQuery(Star):
 • /admin info - 查看当前用户信息
 
 🤖 自动功能:
-• 发送包含"炸了?"或"服务器炸了?"的消息会自动检测所有预设服务器状态
+• 发送包含"炸了?"的消息会自动检测所有预设服务器状态(同一群聊30秒内重复触发会复用上一次结果)
 
 📝 使用示例:
 • /servers - 查看所有预设服务器
-• /xy - 查询所有椿雨服务器状态
+• /xy - 查询所有预设服务器状态
 • /cx 127.0.0.1 - 查询自定义服务器
+• /cx 127.0.0.1:7777-7790 10.0.0.0/28 - 批量查询端口范围和网段
 • /zc - 查询当前群聊绑定的服务器
 • /zc 192.168.1.100 7777 我的服务器 - 设置群聊服务器
 • /openid - 获取当前群聊的OpenID
 • /myid - 获取当前用户的OpenID和权限信息
-• /groups - 查看所有已绑定服务器的群聊
+• /groups - 查看已绑定服务器的群聊(第1页)
+• /groups 192.168.1.100:7777 2 - 查看绑定该服务器的群聊第2页
 • /unbind - 解绑当前群聊的服务器
 • /unbind 123456 - 删除指定群聊(ID:123456)的绑定
 • /admin add 12345678 张三 - 添加管理员
+• /trend 椿雨萌新服 12 - 查看椿雨萌新服最近12小时的人数趋势
 • 服务器炸了? - 自动检测所有服务器
 
 💡 提示:
 • 默认端口为7777
 • 支持TCP和UDP查询
-• 查询超时时间为5秒
-• 预设服务器可快速查询
+• 查询超时按服务器延迟自动调整，最长5秒
+• 连续无响应的服务器会直接显示离线及最近检测时间，并在后台自动重试
+• 预设服务器可快速查询，列表在插件目录的servers.json中配置，修改后自动生效
 • /zc、/openid、/unbind命令只能在群聊中使用
 • /myid命令可在任何地方使用，显示用户身份和权限
 • 每个群聊可以绑定一个专属服务器
@@ -947,4 +1223,17 @@ class SCPSLServerQuery(Star):
     
     async def terminate(self):
         """插件卸载时调用"""
+        await self.poller.stop()
+        await self.compactor.stop()
+        probe_tasks = list(self._probe_tasks)
+        for task in probe_tasks:
+            task.cancel()
+        await asyncio.gather(*probe_tasks, return_exceptions=True)
+        # 进行中的查询会写入人数历史，必须在关闭socket、样本写入器和数据库之前结束
+        await self.trigger_replies.cancel()
+        await self.status_cache.cancel()
+        await self.metrics_exporter.stop()
+        self.a2s.close()
+        await self.sample_writer.close()
+        await self.storage.close()
         logger.info("SCP:SL服务器查询插件已卸载")
\ No newline at end of file
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+SCP:SL 服务器查询核心组件
+不依赖astrbot框架，供插件主体与独立测试脚本共用
+"""
+
+from .batch import gather_bounded
+from .bindings import BindingIndex
+from .breaker import CircuitBreaker
+from .cache import StatusCache
+from .client import A2SClient
+from .history import HistoryCompactor, HistoryStore, SampleWriter, TrendSummary
+from .parser import (
+    A2SError,
+    PlayerInfo,
+    ServerDetails,
+    ServerInfo,
+    parse_info,
+    parse_players,
+    parse_rules,
+)
+from .metrics import LatencyHistogram, MetricsExporter, QueryMetrics
+from .poller import StatusPoller
+from .registry import PresetServer, RegistryError, ServerRegistry
+from .resolver import HostResolver
+from .rtt import RttTable
+from .storage import Storage
+from .targets import TargetError, expand_targets
+from .trigger import KeywordMatcher
+
+__all__ = [
+    "A2SClient",
+    "A2SError",
+    "BindingIndex",
+    "CircuitBreaker",
+    "HistoryCompactor",
+    "HistoryStore",
+    "HostResolver",
+    "KeywordMatcher",
+    "LatencyHistogram",
+    "MetricsExporter",
+    "PlayerInfo",
+    "PresetServer",
+    "QueryMetrics",
+    "RegistryError",
+    "RttTable",
+    "SampleWriter",
+    "ServerDetails",
+    "ServerInfo",
+    "ServerRegistry",
+    "StatusCache",
+    "StatusPoller",
+    "Storage",
+    "TargetError",
+    "TrendSummary",
+    "expand_targets",
+    "gather_bounded",
+    "parse_info",
+    "parse_players",
+    "parse_rules",
+]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务的生命周期
+轮询、人数历史汇总和指标导出共用同一套启动与停止逻辑
+"""
+
+import asyncio
+from typing import Optional
+
+
+class BackgroundTask:
+    """
+    在事件循环中运行_run()的长期任务，子类实现_run()
+    插件加载时可能还没有运行中的事件循环，start()可在之后反复调用，已在运行时不做任何事
+    """
+
+    _task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> bool:
+        """启动后台任务，没有运行中的事件循环时返回False（稍后可再次调用）"""
+        if self.running:
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._task = loop.create_task(self._run())
+        return True
+
+    async def stop(self):
+        """取消后台任务并等待其结束"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        raise NotImplementedError
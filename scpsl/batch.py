@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+批量并发查询工具
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+
+async def gather_bounded(
+    items: Iterable[T],
+    func: Callable[[T], Awaitable[Any]],
+    concurrency: int,
+    deadline: float,
+) -> List[Any]:
+    """
+    对items中的每一项并发执行func，同时运行的数量不超过concurrency
+    所有任务共享一个总截止时间deadline（秒）
+
+    返回结果顺序与items一致：
+    - 正常完成的位置为func的返回值
+    - 抛出异常的位置为该异常对象
+    - 截止时间内未完成的位置为None
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item: T):
+        async with semaphore:
+            return await func(item)
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    if not tasks:
+        return []
+
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        # 等待被取消的任务结束，避免遗留未回收的task
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = []
+    for task in tasks:
+        if task not in done or task.cancelled():
+            results.append(None)
+        elif task.exception() is not None:
+            results.append(task.exception())
+        else:
+            results.append(task.result())
+    return results
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+群聊绑定的内存索引
+启动时从数据库加载一次，之后随数据库写入同步更新
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+Address = Tuple[str, int]
+Binding = Tuple[str, int, Optional[str]]
+
+
+class BindingIndex:
+    """group_id -> (server_ip, server_port, server_name)，以及 地址 -> 绑定该地址的群聊集合"""
+
+    def __init__(self):
+        self._by_group: Dict[str, Binding] = {}
+        self._by_address: Dict[Address, Set[str]] = {}
+
+    def load(self, rows: Iterable[Tuple[str, str, int, Optional[str]]]):
+        """用 (group_id, server_ip, server_port, server_name) 行重建索引"""
+        self._by_group.clear()
+        self._by_address.clear()
+        for group_id, server_ip, server_port, server_name in rows:
+            self.set(group_id, server_ip, server_port, server_name)
+
+    def get(self, group_id: str) -> Optional[Binding]:
+        return self._by_group.get(group_id)
+
+    def set(self, group_id: str, server_ip: str, server_port: int, server_name: Optional[str]):
+        self.remove(group_id)
+        self._by_group[group_id] = (server_ip, server_port, server_name)
+        self._by_address.setdefault((server_ip, server_port), set()).add(group_id)
+
+    def remove(self, group_id: str) -> Optional[Binding]:
+        binding = self._by_group.pop(group_id, None)
+        if binding is not None:
+            address = (binding[0], binding[1])
+            groups = self._by_address.get(address)
+            if groups is not None:
+                groups.discard(group_id)
+                if not groups:
+                    del self._by_address[address]
+        return binding
+
+    def groups_for(self, server_ip: str, server_port: int) -> FrozenSet[str]:
+        """绑定了该服务器地址的所有群聊"""
+        return frozenset(self._by_address.get((server_ip, server_port), ()))
+
+    def count(self, server_ip: Optional[str] = None, server_port: Optional[int] = None) -> int:
+        """绑定的群聊数，可按服务器IP（及端口）过滤"""
+        if server_ip is None:
+            return len(self._by_group)
+        if server_port is not None:
+            return len(self._by_address.get((server_ip, server_port), ()))
+        return sum(len(groups) for (ip, _), groups in self._by_address.items() if ip == server_ip)
+
+    def addresses(self) -> List[Address]:
+        """所有被绑定的不同服务器地址"""
+        return list(self._by_address)
+
+    def __len__(self) -> int:
+        return len(self._by_group)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+离线服务器熔断
+连续查询失败的服务器进入熔断状态，期间不再发起查询，直接判定离线；
+到达重试时间后只放行一次探测，探测成功才恢复，失败则加倍等待时间
+"""
+
+import time
+from typing import Dict, Hashable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _Circuit:
+    __slots__ = ("state", "failures", "opened", "retry_at", "checked_at")
+
+    def __init__(self):
+        self.state = CLOSED
+        # 连续失败次数
+        self.failures = 0
+        # 连续熔断次数，决定下次等待多久
+        self.opened = 0
+        self.retry_at = 0.0
+        self.checked_at = 0.0
+
+
+class CircuitBreaker:
+    """
+    按key（服务器地址）维护熔断状态
+    - closed：正常查询；连续失败failure_threshold次后转为open
+    - open：allow()返回False；到达重试时间后take_probe()放行一次探测并转为half_open
+    - half_open：只有那一次探测在进行，其余调用仍被拒绝；探测成功转为closed，失败重新open
+    第n次熔断的等待时间为 base_backoff * 2^(n-1)，不超过max_backoff
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 2,
+        base_backoff: float = 10.0,
+        max_backoff: float = 300.0,
+        max_entries: int = 4096,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_entries = max_entries
+        # 只记录失败过的key，正常的key不占用空间
+        self._circuits: Dict[Hashable, _Circuit] = {}
+        # 因熔断而跳过的查询次数
+        self.short_circuited = 0
+
+    def state(self, key: Hashable) -> str:
+        circuit = self._circuits.get(key)
+        return CLOSED if circuit is None else circuit.state
+
+    def allow(self, key: Hashable) -> bool:
+        """是否可以正常查询；返回False时调用者应直接判定离线"""
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit.state == CLOSED:
+            return True
+        self.short_circuited += 1
+        return False
+
+    def take_probe(self, key: Hashable) -> bool:
+        """熔断已到重试时间时返回True并转为half_open，调用者负责发起唯一的一次探测"""
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit.state != OPEN or time.monotonic() < circuit.retry_at:
+            return False
+        circuit.state = HALF_OPEN
+        return True
+
+    def record(self, key: Hashable, success: bool):
+        """记录一次实际查询（或探测）的结果"""
+        now = time.monotonic()
+        circuit = self._circuits.get(key)
+        if success:
+            if circuit is not None:
+                del self._circuits[key]
+            return
+
+        if circuit is None:
+            if len(self._circuits) >= self.max_entries:
+                del self._circuits[next(iter(self._circuits))]
+            circuit = self._circuits[key] = _Circuit()
+        circuit.checked_at = now
+        circuit.failures += 1
+        if circuit.state == HALF_OPEN or circuit.failures >= self.failure_threshold:
+            circuit.state = OPEN
+            circuit.opened += 1
+            backoff = self.base_backoff * 2 ** min(circuit.opened - 1, 16)
+            circuit.retry_at = now + min(backoff, self.max_backoff)
+
+    def checked_ago(self, key: Hashable) -> Optional[float]:
+        """距上次失败的实际查询过去了多少秒，没有失败记录时返回None"""
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            return None
+        return time.monotonic() - circuit.checked_at
+
+    @property
+    def open_count(self) -> int:
+        """处于熔断（open或half_open）状态的key数量"""
+        return sum(1 for circuit in self._circuits.values() if circuit.state != CLOSED)
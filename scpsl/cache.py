@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+服务器状态缓存
+带TTL、过期后后台刷新（stale-while-revalidate），并合并同一key的并发请求
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class StatusCache:
+    """
+    按key缓存查询结果
+    - 结果在ttl秒内直接返回
+    - 超过ttl但未超过ttl+stale_ttl时返回旧结果，同时在后台刷新
+    - 同一key同时只会有一个查询在进行，并发调用者共享该查询的结果
+    - 超过ttl+stale_ttl的结果在写入新结果时清除；最多保留max_entries个，超出时淘汰最早写入的
+    """
+
+    def __init__(self, ttl: float = 10.0, stale_ttl: float = 30.0, max_entries: int = 4096):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        # key -> (结果, 获取时间)，按写入时间排序
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        # key -> 进行中的查询
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 命中统计：新鲜命中、过期命中（同时后台刷新）、未命中
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """获取key对应的结果，必要时调用fetch()查询"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[1]
+            if age < self.ttl:
+                self.hits += 1
+                return entry[0]
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._fetch(key, fetch)
+                return entry[0]
+
+        self.misses += 1
+        # shield：某个调用者被取消时不影响其他共享该查询的调用者
+        return await asyncio.shield(self._fetch(key, fetch))
+
+    async def refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """忽略现有缓存强制查询一次（若已有进行中的查询则共享它）"""
+        return await asyncio.shield(self._fetch(key, fetch))
+
+    @property
+    def hit_ratio(self) -> float:
+        """get()中直接返回缓存结果（含过期结果）的比例"""
+        total = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / total if total else 0.0
+
+    @property
+    def inflight(self) -> int:
+        """进行中的查询数"""
+        return len(self._inflight)
+
+    def peek(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """不触发查询，返回 (结果, 已缓存秒数)，无缓存时返回None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[0], time.monotonic() - entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        """直接写入一个新结果"""
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        # 最早写入的在最前面：清除已彻底过期的结果，并保证不超过max_entries
+        expired = now - self.ttl - self.stale_ttl
+        while self._entries:
+            oldest = next(iter(self._entries))
+            if self._entries[oldest][1] > expired and len(self._entries) < self.max_entries:
+                break
+            del self._entries[oldest]
+        self._entries[key] = (value, now)
+
+    async def cancel(self):
+        """取消所有进行中的查询并等待它们结束（卸载时使用，避免查询在资源关闭后继续运行）"""
+        futures = list(self._inflight.values())
+        for future in futures:
+            future.cancel()
+        if futures:
+            await asyncio.gather(*futures, return_exceptions=True)
+        # 尚未开始运行就被取消的查询不会执行_run中的清理，这里统一清除
+        self._inflight.clear()
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(key, fetch))
+            # 后台刷新可能无人等待，这里取走异常避免未处理异常警告
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[key] = future
+        return future
+
+    async def _run(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+            self.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""
+基于asyncio的A2S查询引擎
+全部网络IO都走事件循环，不会阻塞其他插件
+"""
+
+import asyncio
+import time
+import socket
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from .parser import (
+    A2SError,
+    ServerDetails,
+    ServerInfo,
+    parse_info,
+    parse_players,
+    parse_rules,
+)
+from .reassembly import SPLIT_HEADER, SplitReassembler
+from .resolver import HostResolver
+from .rtt import RttTable
+
+# A2S协议常量
+A2S_HEADER = b"\xFF\xFF\xFF\xFF"
+A2S_INFO_REQUEST = A2S_HEADER + b"\x54Source Engine Query\x00"
+A2S_PLAYER_REQUEST = A2S_HEADER + b"\x55"
+A2S_RULES_REQUEST = A2S_HEADER + b"\x56"
+S2C_CHALLENGE = 0x41
+A2S_INFO_RESPONSE = 0x49
+A2S_PLAYER_RESPONSE = 0x44
+A2S_RULES_RESPONSE = 0x45
+
+# 尚未获得challenge时A2S_PLAYER/A2S_RULES使用的占位值
+NO_CHALLENGE = b"\xFF\xFF\xFF\xFF"
+
+# 响应类型 -> (请求前缀, 没有challenge时附加的内容)
+_REQUESTS = {
+    A2S_INFO_RESPONSE: (A2S_INFO_REQUEST, b""),
+    A2S_PLAYER_RESPONSE: (A2S_PLAYER_REQUEST, NO_CHALLENGE),
+    A2S_RULES_RESPONSE: (A2S_RULES_REQUEST, NO_CHALLENGE),
+}
+
+# 最多缓存多少个端点的challenge
+CHALLENGE_CACHE_SIZE = 4096
+
+# 查询端口记忆的有效期（秒）
+PORT_MEMO_TTL = 600.0
+
+# 一个请求最多重发几次，之后即判定无响应（即使总超时还没到）
+MAX_RETRIES = 2
+
+# 一次查询最多容忍几个重复的challenge响应；重发的每份副本各产生一个，超过即视为服务器异常
+MAX_DUPLICATE_CHALLENGES = 4
+
+
+Address = Tuple[str, int]
+
+
+class _A2SProtocol(asyncio.DatagramProtocol):
+    """
+    所有查询共用的UDP协议对象
+    按 (来源地址, 响应类型) 把数据包分发给等待中的future，
+    无人等待的迟到包或来源不明的包直接丢弃
+    请求在该端点的RTO内没有回复时重发，RTO每次加倍，
+    端点或同一主机回复过时，重发max_retries次后即判定无响应
+    """
+
+    def __init__(self, reassembler: SplitReassembler, rtt: RttTable, max_retries: int = MAX_RETRIES):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.reassembler = reassembler
+        self.rtt = rtt
+        self.max_retries = max_retries
+        self.retransmits = 0
+        # 来源地址 -> [(可接受的响应类型, future)]，先到先得
+        self._waiters: Dict[Address, List[Tuple[FrozenSet[int], asyncio.Future]]] = {}
+        self.dropped_packets = 0
+        self.in_flight = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        addr = addr[:2]
+        waiters = self._waiters.get(addr)
+        if waiters and data[:4] == SPLIT_HEADER:
+            # 分包响应收齐后再按完整响应分发
+            data = self.reassembler.feed(addr, data)
+            if data is None:
+                return
+        if waiters and len(data) >= 5 and data[:4] == A2S_HEADER:
+            for i, (expect, waiter) in enumerate(waiters):
+                if data[4] in expect and not waiter.done():
+                    del waiters[i]
+                    if not waiters:
+                        del self._waiters[addr]
+                    waiter.set_result(data)
+                    return
+        self.dropped_packets += 1
+
+    def error_received(self, exc: Exception):
+        # 未连接的UDP socket无法得知错误对应哪个地址，只能忽略，由超时兜底
+        pass
+
+    def connection_lost(self, exc: Optional[Exception]):
+        error = exc or ConnectionError("查询socket已关闭")
+        for waiters in self._waiters.values():
+            for _, waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(error)
+        self._waiters.clear()
+
+    async def request(
+        self, addr: Address, payload: bytes, expect: FrozenSet[int], timeout: float, send: bool = True
+    ) -> bytes:
+        """
+        向addr发送一个数据包，等待一个类型在expect中的回复
+        timeout为总时限；在此之内按RTO重发，重发次数用尽或总时限到达时抛出asyncio.TimeoutError
+        send为False时不立即发送，只等待之前已发出的同一请求的回复，超过RTO仍按正常规则重发
+        """
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        entry = (expect, waiter)
+        self._waiters.setdefault(addr, []).append(entry)
+        self.in_flight += 1
+        try:
+            deadline = loop.time() + timeout
+            rto = self.rtt.rto(addr)
+            # 端点及同一主机都从未回复过时不知道正常延迟，一直重发到总时限，避免把慢服务器误判为离线
+            max_retries = self.max_retries if self.rtt.known(addr) else None
+            sent_at = loop.time()
+            if send:
+                self.transport.sendto(payload, addr)
+            attempt = 0
+            while True:
+                remaining = deadline - loop.time()
+                if remaining > 0:
+                    # 重发后仍接受对之前请求的回复，因此只等待同一个future
+                    await asyncio.wait((waiter,), timeout=min(rto, remaining))
+                if waiter.done():
+                    break
+                if remaining <= 0 or (max_retries is not None and attempt >= max_retries):
+                    self.rtt.backoff(addr)
+                    raise asyncio.TimeoutError()
+                attempt += 1
+                rto = min(rto * 2, self.rtt.max_rto)
+                self.retransmits += 1
+                self.transport.sendto(payload, addr)
+
+            response = waiter.result()
+            # 重发过的请求无法区分回复对应哪次发送，按首次发送计时，只会高估RTT
+            self.rtt.observe(addr, loop.time() - sent_at)
+            return response
+        finally:
+            self.in_flight -= 1
+            waiters = self._waiters.get(addr)
+            if waiters is not None and entry in waiters:
+                waiters.remove(entry)
+                if not waiters:
+                    del self._waiters[addr]
+
+
+class A2SClient:
+    """非阻塞A2S查询客户端"""
+
+    def __init__(
+        self,
+        timeout: float = 5.0,
+        port_memo_ttl: float = PORT_MEMO_TTL,
+        max_split_buffer: int = 1 << 20,
+        min_rto: float = 0.1,
+        max_rto: float = 3.0,
+        max_retries: int = MAX_RETRIES,
+        resolver: Optional[HostResolver] = None,
+    ):
+        self.timeout = timeout
+        self.port_memo_ttl = port_memo_ttl
+        # (ip, 游戏端口) -> (实际应答的查询端口, 过期时间)
+        self._port_memo: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        # 端点 -> 最近一次收到的challenge，下次查询直接带上，省去一次往返
+        self._challenges: Dict[Address, bytes] = {}
+        # 所有查询共用一个长期存在的UDP socket
+        self._protocol: Optional[_A2SProtocol] = None
+        self._protocol_lock: Optional[asyncio.Lock] = None
+        # 分包重组：缓冲总量不超过max_split_buffer字节，未收齐的分包组在超时后丢弃
+        self.reassembler = SplitReassembler(max_buffered=max_split_buffer, timeout=timeout)
+        # 每个端点的RTT估算，决定重发间隔和判定无响应的时间；timeout只是总上限
+        self.rtt = RttTable(initial_rto=min(1.0, timeout), min_rto=min_rto, max_rto=max_rto)
+        self.max_retries = max_retries
+        # 收到的challenge响应数（每次都意味着多一次往返）
+        self.challenges_received = 0
+        # 主机名解析缓存，所有查询共用
+        self.resolver = resolver if resolver is not None else HostResolver()
+
+    async def _get_protocol(self) -> _A2SProtocol:
+        """获取共享的UDP端点，首次使用或socket被关闭后重新创建"""
+        if self._protocol is not None and not self._protocol.transport.is_closing():
+            return self._protocol
+        if self._protocol_lock is None:
+            self._protocol_lock = asyncio.Lock()
+        async with self._protocol_lock:
+            if self._protocol is None or self._protocol.transport.is_closing():
+                loop = asyncio.get_running_loop()
+                _, self._protocol = await loop.create_datagram_endpoint(
+                    lambda: _A2SProtocol(self.reassembler, self.rtt, self.max_retries),
+                    local_addr=("0.0.0.0", 0),
+                    family=socket.AF_INET,
+                )
+        return self._protocol
+
+    @property
+    def in_flight(self) -> int:
+        """正在等待回复的请求数"""
+        return self._protocol.in_flight if self._protocol is not None else 0
+
+    @property
+    def retransmits(self) -> int:
+        """因超过RTO未收到回复而重发的请求数"""
+        return self._protocol.retransmits if self._protocol is not None else 0
+
+    @property
+    def dropped_packets(self) -> int:
+        """无人等待或无法识别而丢弃的数据包数"""
+        return self._protocol.dropped_packets if self._protocol is not None else 0
+
+    def close(self):
+        """关闭共享socket，等待中的查询会立即失败"""
+        if self._protocol is not None:
+            self._protocol.transport.close()
+            self._protocol = None
+
+    async def _resolve(self, host: str, timeout: Optional[float] = None) -> str:
+        """把主机名解析为IPv4地址，回包按来源IP分发，必须使用解析后的地址"""
+        return await self.resolver.resolve(host, timeout)
+
+    @staticmethod
+    def candidate_ports(port: int) -> List[int]:
+        """可能的查询端口：游戏端口本身及其相邻端口"""
+        return [p for p in (port, port + 1, port - 1) if 1 <= p <= 65535]
+
+    async def query_server(
+        self, ip: str, port: int, timeout: Optional[float] = None, probe_neighbours: bool = True
+    ) -> ServerInfo:
+        """
+        查询游戏端口为port的服务器
+        已记住查询端口时只发一个包；否则同时探测所有候选端口，游戏端口本身优先（见_race_ports）
+        probe_neighbours为False时只查询port本身，不使用也不更新查询端口记忆：
+        扫描端口范围时，相邻的空端口不会被旁边的服务器代为应答
+        返回值与query_info相同
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if not probe_neighbours:
+            return await self.query_info(ip, port, timeout)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        key = (ip, port)
+        candidates = self.candidate_ports(port)
+        # 只解析一次，之后各候选端口的探测直接使用解析后的地址
+        host = await self._resolve(ip, timeout)
+
+        memo = self._port_memo.get(key)
+        if memo is not None and memo[1] > time.monotonic():
+            try:
+                return await self.query_info(host, memo[0], deadline - loop.time())
+            except (asyncio.TimeoutError, OSError, A2SError):
+                # 记住的端口失效（服务器离线或换了查询端口），剩余时间内重新探测其他候选端口；
+                # 同一主机已有RTT样本，其他端口同样重发max_retries次即判定无响应，离线服务器仍很快判定失败
+                self._port_memo.pop(key, None)
+                candidates = [p for p in candidates if p != memo[0]]
+                if not candidates or deadline - loop.time() <= 0:
+                    raise
+
+        query_port, result = await self._race_ports(host, port, candidates, deadline - loop.time())
+        self._port_memo[key] = (query_port, time.monotonic() + self.port_memo_ttl)
+        return result
+
+    async def _race_ports(self, ip: str, port: int, ports: List[int], timeout: float) -> Tuple[int, ServerInfo]:
+        """
+        并行探测多个端口，返回 (采用的查询端口, query_info结果)，其余探测被取消
+        同一台机器上常有相邻端口的多个服务器，因此游戏端口port本身优先：
+        - 游戏端口应答，或应答在EDF中声明的游戏端口就是port时立即采用
+        - EDF声明了其他游戏端口的应答属于别的服务器，直接忽略
+        - 其他相邻端口的应答只在游戏端口已失败，或自开始起超过该端口的RTO仍未应答时才采用
+        """
+        loop = asyncio.get_running_loop()
+        grace_until = loop.time() + self.rtt.rto((ip, port))
+        tasks = {asyncio.ensure_future(self.query_info(ip, p, timeout)): p for p in ports}
+        errors: Dict[int, BaseException] = {}
+        fallback: Optional[Tuple[int, ServerInfo]] = None
+        try:
+            pending = set(tasks)
+            while pending:
+                wait = None if fallback is None else max(0.0, grace_until - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    query_port = tasks[task]
+                    if task.exception() is not None:
+                        errors[query_port] = task.exception()
+                        continue
+                    info = task.result()
+                    if query_port == port or info.game_port == port:
+                        return query_port, info
+                    if info.game_port is not None:
+                        errors[query_port] = A2SError(f"端口{query_port}应答的是游戏端口{info.game_port}的服务器")
+                    elif fallback is None:
+                        fallback = (query_port, info)
+                if fallback is not None and (port not in ports or port in errors or loop.time() >= grace_until):
+                    return fallback
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # 全部失败：报告游戏端口本身的错误
+        raise errors.get(port, errors[ports[0]])
+
+    async def query_info(self, ip: str, port: int, timeout: Optional[float] = None) -> ServerInfo:
+        """
+        发送A2S_INFO查询（自动处理challenge）并解析响应
+        超时抛出asyncio.TimeoutError，响应格式错误抛出A2SError
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        addr = (await self._resolve(ip, timeout), port)
+        protocol = await self._get_protocol()
+
+        start_time = time.time()
+        response = await self._exchange(protocol, addr, A2S_INFO_RESPONSE, deadline)
+        ping = round((time.time() - start_time) * 1000)
+        return parse_info(response, ping)
+
+    async def query_details(self, ip: str, port: int, timeout: Optional[float] = None) -> ServerDetails:
+        """
+        查询游戏端口为port的服务器的A2S_INFO、A2S_PLAYER、A2S_RULES
+        已知查询端口和challenge时三个请求同时发出，只需一次往返；
+        否则先用A2S_INFO找到查询端口并取得challenge，再同时发出另外两个请求
+        玩家列表或规则查询失败时对应部分为空，A2S_INFO失败则抛出异常
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        key = (ip, port)
+        host = await self._resolve(ip, timeout)
+
+        memo = self._port_memo.get(key)
+        if memo is not None and memo[1] > time.monotonic():
+            addr = (host, memo[0])
+            if addr in self._challenges:
+                protocol = await self._get_protocol()
+                info, players, rules = await asyncio.gather(
+                    self.query_info(host, memo[0], deadline - loop.time()),
+                    self._exchange(protocol, addr, A2S_PLAYER_RESPONSE, deadline),
+                    self._exchange(protocol, addr, A2S_RULES_RESPONSE, deadline),
+                    return_exceptions=True,
+                )
+                if isinstance(info, BaseException):
+                    self._port_memo.pop(key, None)
+                    raise info
+                return self._build_details(info, players, rules)
+
+        info = await self.query_server(ip, port, deadline - loop.time())
+        addr = (host, self._port_memo[key][0])
+        protocol = await self._get_protocol()
+        players, rules = await asyncio.gather(
+            self._exchange(protocol, addr, A2S_PLAYER_RESPONSE, deadline),
+            self._exchange(protocol, addr, A2S_RULES_RESPONSE, deadline),
+            return_exceptions=True,
+        )
+        return self._build_details(info, players, rules)
+
+    @staticmethod
+    def _build_details(info: ServerInfo, players, rules) -> ServerDetails:
+        try:
+            players = () if isinstance(players, BaseException) else parse_players(players)
+        except A2SError:
+            players = ()
+        try:
+            rules = {} if isinstance(rules, BaseException) else parse_rules(rules)
+        except A2SError:
+            rules = {}
+        return ServerDetails(info, players, rules)
+
+    async def _exchange(self, protocol: _A2SProtocol, addr: Address, response_type: int, deadline: float) -> bytes:
+        """
+        发送一种A2S请求并返回完整响应，请求会带上该端点缓存的challenge
+        收到新的challenge时更新缓存并重试；重发产生的重复challenge响应会被跳过
+        """
+        prefix, no_challenge = _REQUESTS[response_type]
+        expect = frozenset((S2C_CHALLENGE, response_type))
+        loop = asyncio.get_running_loop()
+
+        sent = self._challenges.get(addr, no_challenge)
+        response = await protocol.request(addr, prefix + sent, expect, deadline - loop.time())
+
+        # 没有challenge或challenge已过期：记住新的challenge并重试
+        # 请求被重发过时，服务器会对每份副本各回一个challenge，与已发送的相同即为重复：
+        # 不再发送，只等待已发出的请求的回复；一直重复同一个challenge的服务器在几次之后放弃
+        renewed = duplicates = 0
+        while response[4] == S2C_CHALLENGE:
+            if len(response) < 9:
+                raise A2SError("Challenge响应格式错误")
+            challenge = bytes(response[5:9])
+            if challenge != sent:
+                renewed += 1
+                if renewed > 2:
+                    raise A2SError("重复收到challenge响应")
+                self.challenges_received += 1
+                self._remember_challenge(addr, challenge)
+                sent = challenge
+                fresh = True
+            else:
+                duplicates += 1
+                if duplicates > MAX_DUPLICATE_CHALLENGES:
+                    raise A2SError("服务器一直返回相同的challenge")
+                fresh = False
+            response = await protocol.request(addr, prefix + sent, expect, deadline - loop.time(), send=fresh)
+        return response
+
+    def _remember_challenge(self, addr: Address, challenge: bytes):
+        self._challenges.pop(addr, None)
+        self._challenges[addr] = challenge
+        # 超出上限时丢弃最早记录的端点
+        if len(self._challenges) > CHALLENGE_CACHE_SIZE:
+            del self._challenges[next(iter(self._challenges))]
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+服务器人数历史
+每个服务器一个环形缓冲区，各列使用array存储，随样本增加而增长，最多capacity个样本
+"""
+
+import asyncio
+import logging
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .background import BackgroundTask
+from .storage import ROLLUP_LEVELS
+
+Address = Tuple[str, int]
+SampleRow = Tuple[str, float, int, int]
+
+# 离线样本的人数与延迟
+OFFLINE = -1
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+class SampleRing:
+    """
+    (时间戳, 人数, 延迟) 的环形缓冲区，写满后覆盖最旧的样本
+    数组在写满前按需增长，只被/cx查询过一两次的服务器不会占用整个容量的内存
+    """
+
+    __slots__ = ("capacity", "ts", "players", "ping", "_next", "_count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = array("d")
+        self.players = array("h")
+        self.ping = array("i")
+        self._next = 0
+        self._count = 0
+
+    def append(self, ts: float, players: int, ping: int):
+        if self._count < self.capacity:
+            # 尚未写满：追加到数组末尾
+            self.ts.append(ts)
+            self.players.append(players)
+            self.ping.append(ping)
+            self._count += 1
+            self._next = self._count % self.capacity
+            return
+        i = self._next
+        self.ts[i] = ts
+        self.players[i] = players
+        self.ping[i] = ping
+        self._next = (i + 1) % self.capacity
+
+    def since(self, start: float) -> Iterator[Tuple[float, int, int]]:
+        """按时间顺序返回时间戳不早于start的样本"""
+        first = (self._next - self._count) % self.capacity
+        capacity = self.capacity
+        # 样本按时间顺序写入，二分查找窗口起点
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[(first + mid) % capacity] < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        for n in range(lo, self._count):
+            i = (first + n) % capacity
+            yield self.ts[i], self.players[i], self.ping[i]
+
+    def __len__(self) -> int:
+        return self._count
+
+
+@dataclass(frozen=True, slots=True)
+class TrendSummary:
+    """一段时间内的人数统计"""
+
+    samples: int
+    online_samples: int
+    min_players: int
+    max_players: int
+    avg_players: float
+    sparkline: str
+
+    @property
+    def availability(self) -> float:
+        return self.online_samples / self.samples if self.samples else 0.0
+
+
+class HistoryStore:
+    """所有服务器的内存历史，按地址懒创建环形缓冲区"""
+
+    def __init__(self, capacity: int = 8640, max_servers: int = 1024):
+        self.capacity = capacity
+        self.max_servers = max_servers
+        self._rings: Dict[Address, SampleRing] = {}
+
+    def record(self, address: Address, players: int, ping: int, ts: Optional[float] = None):
+        """记录一个样本，离线时players和ping传OFFLINE"""
+        ring = self._rings.get(address)
+        if ring is None:
+            if len(self._rings) >= self.max_servers:
+                # 超出上限时淘汰最早加入的服务器
+                del self._rings[next(iter(self._rings))]
+            ring = self._rings[address] = SampleRing(self.capacity)
+        ring.append(time.time() if ts is None else ts, players, ping)
+
+    def oldest(self, address: Address) -> Optional[float]:
+        """内存中最早样本的时间戳"""
+        ring = self._rings.get(address)
+        if not ring:
+            return None
+        return next(ring.since(0.0))[0]
+
+    def summarize(self, address: Address, seconds: float, width: int = 24) -> Optional[TrendSummary]:
+        """统计内存中最近seconds秒的人数，sparkline按时间等分为width段，每段取平均人数"""
+        ring = self._rings.get(address)
+        if ring is None:
+            return None
+        now = time.time()
+        start = now - seconds
+        rows = (
+            (ts, 1, players >= 0, players, players, max(players, 0))
+            for ts, players, _ in ring.since(start)
+        )
+        return summarize_rows(rows, start, now, width)
+
+
+def summarize_rows(rows, start: float, end: float, width: int = 24) -> Optional[TrendSummary]:
+    """
+    根据汇总行 (时间, 样本数, 在线样本数, 最低人数, 最高人数, 人数总和) 生成TrendSummary
+    原始样本可视为样本数为1的汇总行；没有任何样本时返回None
+    """
+    bucket_sum = [0] * width
+    bucket_count = [0] * width
+    span = max(end - start, 1e-9)
+    count = online = total = 0
+    low = high = None
+    for ts, samples, online_samples, min_players, max_players, sum_players in rows:
+        count += samples
+        if not online_samples:
+            continue
+        online += online_samples
+        total += sum_players
+        low = min_players if low is None else min(low, min_players)
+        high = max_players if high is None else max(high, max_players)
+        b = min(width - 1, max(0, int((ts - start) / span * width)))
+        bucket_sum[b] += sum_players
+        bucket_count[b] += online_samples
+    if not count:
+        return None
+    return TrendSummary(
+        samples=count,
+        online_samples=online,
+        min_players=low or 0,
+        max_players=high or 0,
+        avg_players=total / online if online else 0.0,
+        sparkline=render_sparkline(bucket_sum, bucket_count, high or 0),
+    )
+
+
+def render_sparkline(bucket_sum, bucket_count, peak: int) -> str:
+    """没有在线样本的时间段显示为空格"""
+    chars = []
+    top = len(SPARK_CHARS) - 1
+    for s, c in zip(bucket_sum, bucket_count):
+        if not c:
+            chars.append(" ")
+        elif peak <= 0:
+            chars.append(SPARK_CHARS[0])
+        else:
+            chars.append(SPARK_CHARS[round(s / c / peak * top)])
+    return "".join(chars)
+
+
+def address_key(address: Address) -> str:
+    """持久化时使用的地址字符串"""
+    return f"{address[0]}:{address[1]}"
+
+
+class SampleWriter:
+    """
+    人数样本的延迟批量写入
+    样本先进入内存队列，每flush_interval秒或积累batch_size个样本时用一个事务写入
+    数据库长时间不可用时队列最多保留max_pending个样本，超出部分丢弃最旧的
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[SampleRow]], Awaitable],
+        flush_interval: float = 5.0,
+        batch_size: int = 500,
+        max_pending: int = 100_000,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.write = write
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(__name__)
+        self._pending: Deque[SampleRow] = deque(maxlen=max_pending)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # close()之后不再接受样本，也不再启动后台任务
+        self._closed = False
+
+    def add(self, address: Address, ts: float, players: int, ping: int):
+        """加入一个样本，需在事件循环中调用；close()之后调用不做任何事"""
+        if self._closed:
+            return
+        self._pending.append((address_key(address), ts, players, ping))
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        """把队列中的样本全部写入数据库"""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                try:
+                    await self.write(batch)
+                except Exception:
+                    # 写入失败时放回队列头部，等待下次重试
+                    self._pending.extendleft(reversed(batch))
+                    raise
+
+    async def close(self):
+        """停止后台任务并写入剩余样本"""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            self.logger.error(f"写入人数历史失败: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.logger.error(f"写入人数历史失败: {e}")
+
+
+class HistoryCompactor(BackgroundTask):
+    """
+    后台汇总与清理人数历史
+    - 原始样本逐级汇总为1分钟、1小时、1天的统计
+    - 超过保留期的原始样本和低级汇总被分批删除（只删除已汇总过的数据）
+    - 每一步都是一个小事务，步与步之间让出事件循环
+    """
+
+    # 各数据源（原始样本、1分钟、1小时、1天）适合查询的最大时间窗口
+    MAX_WINDOWS = (6 * 3600, 3 * 86400, 180 * 86400, float("inf"))
+
+    def __init__(
+        self,
+        storage,
+        retention: Tuple[float, float, float],
+        interval: float = 60.0,
+        lag: float = 120.0,
+        purge_batch: int = 5000,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.storage = storage
+        # 原始样本、1分钟汇总、1小时汇总的保留秒数，1天汇总永久保留
+        self.retention = retention
+        self.interval = interval
+        self.lag = lag
+        self.purge_batch = purge_batch
+        self.logger = logger or logging.getLogger(__name__)
+
+    async def run_once(self):
+        now = time.time()
+        for level in range(len(ROLLUP_LEVELS)):
+            while await self.storage.compact_step(level, now, self.lag):
+                await asyncio.sleep(0)
+        for source, keep in enumerate(self.retention):
+            while await self.storage.purge_step(source, now - keep, self.purge_batch) >= self.purge_batch:
+                await asyncio.sleep(0)
+
+    def pick_source(self, start: float, end: float) -> int:
+        """选择覆盖start且粒度合适的数据源：窗口越长、越久远，使用越粗的汇总"""
+        now = time.time()
+        window = end - start
+        for source, keep in enumerate(self.retention):
+            if start >= now - keep and window <= self.MAX_WINDOWS[source]:
+                return source
+        return len(self.retention)
+
+    async def summarize(self, address: Address, seconds: float, width: int = 24) -> Optional[TrendSummary]:
+        """从数据库统计最近seconds秒的人数，自动选择原始样本或汇总表"""
+        end = time.time()
+        start = end - seconds
+        source = self.pick_source(start, end)
+        rows = await self.storage.query_history(address_key(address), start, end, source)
+        return summarize_rows(rows, start, end, width)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"人数历史汇总出错: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+查询指标
+延迟直方图（全局和按服务器）、查询结果计数，以及由其他组件提供的计数器和瞬时值
+可渲染为Prometheus文本格式，并定期写入文件
+"""
+
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .background import BackgroundTask
+
+Address = Tuple[str, int]
+
+# 直方图桶的上界（秒），覆盖局域网到跨洲查询以及超时
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 查询结果分类
+# 共享的UDP套接字没有connect，收不到ICMP端口不可达，因此没有"连接被拒绝"这一类
+OUTCOMES = ("ok", "timeout", "parse_error", "error")
+
+
+class LatencyHistogram:
+    """固定桶的累积直方图，分位数按桶内线性插值估算"""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        # 最后一个桶为 +Inf
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """估算第q分位（0~1）的延迟，没有样本时返回0"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                if i == len(LATENCY_BUCKETS):
+                    return lower
+                return lower + (LATENCY_BUCKETS[i] - lower) * (rank - seen) / n
+            seen += n
+        return LATENCY_BUCKETS[-1]
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class QueryMetrics:
+    """
+    收集查询延迟与结果
+    - observe()记录一次查询，同时计入全局和该服务器的直方图；address为None时只计入全局
+    - 按服务器的直方图最多保留max_servers个，超出时淘汰最早加入的服务器
+    - add_collector()注册由其他组件维护的计数器或瞬时值，渲染时才读取
+    """
+
+    def __init__(self, max_servers: int = 1024):
+        self.max_servers = max_servers
+        self.started = time.time()
+        self.latency = LatencyHistogram()
+        self.outcomes: Dict[str, int] = dict.fromkeys(OUTCOMES, 0)
+        self.servers: Dict[Address, LatencyHistogram] = {}
+        self.server_failures: Dict[Address, int] = {}
+        # (指标名, 说明, 类型, 读取函数)
+        self._collectors: List[Tuple[str, str, str, Callable[[], float]]] = []
+
+    def observe(self, address: Optional[Address], outcome: str, seconds: float):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.latency.observe(seconds)
+        if address is None:
+            return
+        histogram = self.servers.get(address)
+        if histogram is None:
+            if len(self.servers) >= self.max_servers:
+                oldest = next(iter(self.servers))
+                del self.servers[oldest]
+                self.server_failures.pop(oldest, None)
+            histogram = self.servers[address] = LatencyHistogram()
+        histogram.observe(seconds)
+        if outcome != "ok":
+            self.server_failures[address] = self.server_failures.get(address, 0) + 1
+
+    def add_collector(self, name: str, help_text: str, kind: str, read: Callable[[], float]):
+        """注册一个外部指标，kind为counter或gauge"""
+        self._collectors.append((name, help_text, kind, read))
+
+    def collect(self) -> Dict[str, float]:
+        """读取所有外部指标的当前值"""
+        values = {}
+        for name, _, _, read in self._collectors:
+            try:
+                values[name] = read()
+            except Exception:
+                continue
+        return values
+
+    def slowest(self, limit: int = 5) -> List[Tuple[Address, LatencyHistogram]]:
+        """按p95延迟排序的最慢服务器"""
+        ranked = sorted(self.servers.items(), key=lambda item: item[1].quantile(0.95), reverse=True)
+        return ranked[:limit]
+
+    def render_prometheus(self, prefix: str = "scpsl") -> str:
+        """渲染为Prometheus文本格式"""
+        lines: List[str] = []
+
+        name = f"{prefix}_query_outcomes_total"
+        lines.append(f"# HELP {name} A2S查询结果计数")
+        lines.append(f"# TYPE {name} counter")
+        for outcome, count in self.outcomes.items():
+            lines.append(f'{name}{{outcome="{outcome}"}} {count}')
+
+        name = f"{prefix}_query_duration_seconds"
+        lines.append(f"# HELP {name} A2S查询延迟")
+        lines.append(f"# TYPE {name} histogram")
+        lines.extend(_histogram_lines(name, "", self.latency))
+        for (ip, port), histogram in self.servers.items():
+            server = _escape_label(f"{ip}:{port}")
+            lines.extend(_histogram_lines(name, f'server="{server}"', histogram))
+
+        values = self.collect()
+        for metric, help_text, kind, _ in self._collectors:
+            value = values.get(metric)
+            if value is None:
+                continue
+            full = f"{prefix}_{metric}"
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            lines.append(f"{full} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    """按Prometheus文本格式转义标签值中的反斜杠、双引号和换行"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name: str, labels: str, histogram: LatencyHistogram) -> Iterable[str]:
+    sep = "," if labels else ""
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}'
+    yield f'{name}_bucket{{{labels}{sep}le="+Inf"}} {histogram.count}'
+    suffix = f"{{{labels}}}" if labels else ""
+    yield f"{name}_sum{suffix} {round(histogram.total, 6)}"
+    yield f"{name}_count{suffix} {histogram.count}"
+
+
+class MetricsExporter(BackgroundTask):
+    """每interval秒把指标写入Prometheus文本文件（先写临时文件再替换，避免读到半个文件）"""
+
+    def __init__(
+        self,
+        metrics: QueryMetrics,
+        path: str,
+        interval: float = 30.0,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        await super().stop()
+        # 卸载前写入最后一次
+        self.write()
+
+    def write(self):
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.metrics.render_prometheus())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            self.logger.error(f"写入指标文件失败: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+A2S响应解析
+直接在memoryview上解析，只解码需要用到的字段
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+class A2SError(Exception):
+    """A2S响应格式错误"""
+
+
+# A2S_INFO字符串字段之后的定长部分：
+# app_id, 玩家数, 最大玩家数, 机器人数, 服务器类型, 平台, 是否需要密码, VAC
+_INFO_TAIL = struct.Struct("<HBBBccBB")
+# 旧版本服务器可能截断定长部分，缺失的字段使用这些默认值
+_INFO_TAIL_DEFAULTS = _INFO_TAIL.pack(0, 0, 20, 0, b"d", b"l", 0, 0)
+# 定长部分、版本字符串之后的扩展数据标志（EDF），0x80表示随后是游戏端口
+_EDF_PORT = 0x80
+_EDF_PORT_FIELD = struct.Struct("<H")
+# A2S_PLAYER每个玩家名字之后的定长部分：分数, 在线时长（秒）
+_PLAYER_TAIL = struct.Struct("<lf")
+# A2S_RULES开头的规则数量
+_RULES_COUNT = struct.Struct("<H")
+
+# 可能携带回合时间的规则名
+ROUND_TIME_RULES = ("round_time", "RoundTime", "roundtime", "round_duration", "RoundDuration")
+
+
+@dataclass(frozen=True, slots=True)
+class ServerInfo:
+    """A2S_INFO解析结果"""
+
+    name: str
+    map: str
+    game: str
+    players: int
+    max_players: int
+    bots: int
+    server_type: str
+    platform: str
+    password: bool
+    vac: bool
+    ping: int
+    # 服务器在EDF中声明的游戏端口，未提供时为None
+    game_port: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为原查询接口返回的字典格式"""
+        return {
+            'status': 'online',
+            'players': self.players,
+            'max_players': self.max_players,
+            'server_name': self.name,
+            'map': self.map,
+            'game_mode': self.game if self.game else '未知模式',
+            'round_time': '未知',
+            'ping': self.ping,
+            'bots': self.bots,
+            'password': self.password,
+            'vac': self.vac,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerInfo:
+    """A2S_PLAYER中的一个玩家"""
+
+    name: str
+    score: int
+    duration: float
+
+
+@dataclass(frozen=True, slots=True)
+class ServerDetails:
+    """A2S_INFO、A2S_PLAYER、A2S_RULES的合并结果"""
+
+    info: ServerInfo
+    players: Tuple[PlayerInfo, ...]
+    rules: Dict[str, str]
+
+    @property
+    def round_time(self) -> Optional[str]:
+        """从规则中取回合时间，服务器未提供时返回None"""
+        for key in ROUND_TIME_RULES:
+            value = self.rules.get(key)
+            if value:
+                return value
+        return None
+
+
+def _skip_string(data: Union[bytes, bytearray], offset: int) -> int:
+    """跳过一个以\\0结尾的字符串，返回其后的偏移"""
+    end = data.find(b"\x00", offset)
+    if end < 0:
+        raise A2SError("A2S字符串缺少结束符")
+    return end + 1
+
+
+def _read_string(buf: memoryview, data: Union[bytes, bytearray], offset: int):
+    """读取一个以\\0结尾的字符串，返回 (字符串, 其后的偏移)"""
+    end = data.find(b"\x00", offset)
+    if end < 0:
+        raise A2SError("A2S字符串缺少结束符")
+    return str(buf[offset:end], "utf-8", "ignore"), end + 1
+
+
+def parse_info(data: Union[bytes, bytearray], ping: int = 0, offset: int = 5) -> ServerInfo:
+    """
+    解析A2S_INFO响应，offset为协议版本字节的位置（默认跳过 FF FF FF FF 49 响应头）
+    格式错误时抛出A2SError
+    """
+    # 字符串通过memoryview切片解码，结束符用bytes.find定位，都不会复制数据
+    buf = memoryview(data)
+    if len(buf) <= offset:
+        raise A2SError("A2S_INFO数据为空")
+
+    # 跳过协议版本
+    offset += 1
+    name, offset = _read_string(buf, data, offset)
+    map_name, offset = _read_string(buf, data, offset)
+    offset = _skip_string(data, offset)  # 文件夹
+    game, offset = _read_string(buf, data, offset)
+
+    tail = buf[offset:offset + _INFO_TAIL.size]
+    if len(tail) == _INFO_TAIL.size:
+        fields = _INFO_TAIL.unpack_from(tail)
+    else:
+        fields = _INFO_TAIL.unpack(bytes(tail) + _INFO_TAIL_DEFAULTS[len(tail):])
+    _, players, max_players, bots, server_type, platform, password, vac = fields
+
+    game_port = None
+    offset += _INFO_TAIL.size
+    if offset < len(buf):
+        # 版本字符串之后是可选的EDF，缺失或截断时忽略
+        end = data.find(b"\x00", offset)
+        if 0 <= end < len(buf) - 1 - _EDF_PORT_FIELD.size and buf[end + 1] & _EDF_PORT:
+            game_port = _EDF_PORT_FIELD.unpack_from(buf, end + 2)[0]
+
+    return ServerInfo(
+        name=name,
+        map=map_name,
+        game=game,
+        players=players,
+        max_players=max_players,
+        bots=bots,
+        server_type=server_type.decode("latin-1"),
+        platform=platform.decode("latin-1"),
+        password=bool(password),
+        vac=bool(vac),
+        ping=ping,
+        game_port=game_port,
+    )
+
+
+def parse_players(data: Union[bytes, bytearray], offset: int = 5) -> Tuple[PlayerInfo, ...]:
+    """
+    解析A2S_PLAYER响应，offset为玩家数量字节的位置
+    数据被截断时返回已完整解析的玩家
+    """
+    buf = memoryview(data)
+    if len(buf) <= offset:
+        raise A2SError("A2S_PLAYER数据为空")
+
+    count = buf[offset]
+    offset += 1
+    players = []
+    for _ in range(count):
+        # 跳过玩家序号
+        offset += 1
+        if offset >= len(buf) or data.find(b"\x00", offset) < 0:
+            break
+        name, offset = _read_string(buf, data, offset)
+        if offset + _PLAYER_TAIL.size > len(buf):
+            break
+        score, duration = _PLAYER_TAIL.unpack_from(buf, offset)
+        offset += _PLAYER_TAIL.size
+        players.append(PlayerInfo(name, score, duration))
+    return tuple(players)
+
+
+def parse_rules(data: Union[bytes, bytearray], offset: int = 5) -> Dict[str, str]:
+    """
+    解析A2S_RULES响应，offset为规则数量字段的位置
+    数据被截断时返回已完整解析的规则
+    """
+    buf = memoryview(data)
+    if len(buf) < offset + _RULES_COUNT.size:
+        raise A2SError("A2S_RULES数据为空")
+
+    (count,) = _RULES_COUNT.unpack_from(buf, offset)
+    offset += _RULES_COUNT.size
+    rules = {}
+    try:
+        for _ in range(count):
+            name, offset = _read_string(buf, data, offset)
+            value, offset = _read_string(buf, data, offset)
+            rules[name] = value
+    except A2SError:
+        pass
+    return rules
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+后台轮询器
+定期刷新所有关注的服务器状态，命令处理时直接读取缓存中的最新快照
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+from .background import BackgroundTask
+from .batch import gather_bounded
+
+Address = Tuple[str, int]
+
+
+class StatusPoller(BackgroundTask):
+    """
+    按固定间隔刷新await targets()返回的所有地址
+    每轮中相同地址只刷新一次；单轮出错只记录日志，不会让轮询任务退出
+    """
+
+    def __init__(
+        self,
+        targets: Callable[[], Awaitable[Iterable[Address]]],
+        refresh: Callable[[str, int], Awaitable],
+        interval: float = 8.0,
+        concurrency: int = 16,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.targets = targets
+        self.refresh = refresh
+        self.interval = interval
+        self.concurrency = concurrency
+        self.logger = logger or logging.getLogger(__name__)
+
+    async def poll_once(self):
+        """刷新一轮，地址去重后并发查询，整轮不超过一个轮询间隔"""
+        addresses = list(dict.fromkeys(await self.targets()))
+        results = await gather_bounded(
+            addresses,
+            lambda address: self.refresh(address[0], address[1]),
+            self.concurrency,
+            self.interval,
+        )
+        for (ip, port), result in zip(addresses, results):
+            if isinstance(result, Exception):
+                self.logger.debug(f"轮询 {ip}:{port} 出错: {result}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"服务器状态轮询出错: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
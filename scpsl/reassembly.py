@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+A2S分包响应重组
+A2S_RULES和人数较多时的A2S_PLAYER响应会被拆成多个以 FE FF FF FF 开头的数据包
+"""
+
+import bz2
+import struct
+import time
+import zlib
+from typing import Dict, Hashable, List, Optional, Tuple
+
+SPLIT_HEADER = b"\xFE\xFF\xFF\xFF"
+
+# 分包头：请求ID, 分包总数, 当前序号, 每个分包的最大长度
+_SPLIT = struct.Struct("<lBBH")
+# 压缩响应第一个分包额外携带：解压后长度, CRC32
+_COMPRESSED = struct.Struct("<lL")
+_SPLIT_OFFSET = len(SPLIT_HEADER)
+_PAYLOAD_OFFSET = _SPLIT_OFFSET + _SPLIT.size
+
+
+class _PartialResponse:
+    """一组尚未收齐的分包，数据直接写入预分配的缓冲区"""
+
+    __slots__ = ("buffer", "slot_size", "lengths", "missing", "created", "compressed")
+
+    def __init__(self, total: int, slot_size: int, compressed: bool):
+        self.buffer = bytearray(total * slot_size)
+        self.slot_size = slot_size
+        self.lengths: List[int] = [-1] * total
+        self.missing = total
+        self.created = time.monotonic()
+        self.compressed: Optional[Tuple[int, int]] = None if not compressed else (0, 0)
+
+
+class SplitReassembler:
+    """
+    按 (来源地址, 请求ID) 收集分包并重组
+    - 缓冲的总字节数超过max_buffered时丢弃新的分包组
+    - 超过timeout秒仍未收齐的分包组会被丢弃
+    """
+
+    def __init__(self, max_buffered: int = 1 << 20, timeout: float = 5.0, max_packets: int = 32):
+        self.max_buffered = max_buffered
+        self.timeout = timeout
+        self.max_packets = max_packets
+        self._partials: Dict[Tuple[Hashable, int], _PartialResponse] = {}
+        self._buffered = 0
+        self.dropped = 0
+
+    def feed(self, source: Hashable, packet: bytes) -> Optional[bytearray]:
+        """
+        处理一个分包，收齐时返回重组后的完整响应（以 FF FF FF FF 开头），否则返回None
+        格式错误、超出限制或无法解压的分包组会被丢弃
+        """
+        self._expire()
+        if len(packet) < _PAYLOAD_OFFSET:
+            self.dropped += 1
+            return None
+
+        request_id, total, number, slot_size = _SPLIT.unpack_from(packet, _SPLIT_OFFSET)
+        if not (0 < total <= self.max_packets and number < total and slot_size > 0):
+            self.dropped += 1
+            return None
+
+        key = (source, request_id)
+        partial = self._partials.get(key)
+        if partial is None:
+            size = total * slot_size
+            if self._buffered + size > self.max_buffered:
+                self.dropped += 1
+                return None
+            partial = _PartialResponse(total, slot_size, request_id < 0)
+            self._partials[key] = partial
+            self._buffered += size
+        elif len(partial.lengths) != total or partial.slot_size != slot_size:
+            self._discard(key)
+            self.dropped += 1
+            return None
+
+        if partial.lengths[number] >= 0:
+            # 重复的分包
+            return None
+
+        start = _PAYLOAD_OFFSET
+        if partial.compressed is not None and number == 0:
+            if len(packet) < start + _COMPRESSED.size:
+                self._discard(key)
+                self.dropped += 1
+                return None
+            partial.compressed = _COMPRESSED.unpack_from(packet, start)
+            start += _COMPRESSED.size
+
+        chunk = memoryview(packet)[start:]
+        if len(chunk) > slot_size:
+            self._discard(key)
+            self.dropped += 1
+            return None
+        offset = number * slot_size
+        partial.buffer[offset:offset + len(chunk)] = chunk
+        partial.lengths[number] = len(chunk)
+        partial.missing -= 1
+        if partial.missing:
+            return None
+
+        self._discard(key)
+        return self._assemble(partial)
+
+    def _assemble(self, partial: _PartialResponse) -> Optional[bytearray]:
+        slot_size = partial.slot_size
+        lengths = partial.lengths
+        if all(length == slot_size for length in lengths[:-1]):
+            # 只有最后一个分包不满：原地截断即可
+            data = partial.buffer
+            del data[(len(lengths) - 1) * slot_size + lengths[-1]:]
+        else:
+            data = bytearray().join(
+                memoryview(partial.buffer)[i * slot_size:i * slot_size + length]
+                for i, length in enumerate(lengths)
+            )
+
+        if partial.compressed is not None:
+            size, crc = partial.compressed
+            if not (0 < size <= self.max_buffered):
+                self.dropped += 1
+                return None
+            try:
+                decompressor = bz2.BZ2Decompressor()
+                data = bytearray(decompressor.decompress(data, max_length=size))
+            except (OSError, ValueError):
+                self.dropped += 1
+                return None
+            if len(data) != size or zlib.crc32(data) != crc:
+                self.dropped += 1
+                return None
+        return data
+
+    def _discard(self, key):
+        partial = self._partials.pop(key, None)
+        if partial is not None:
+            self._buffered -= len(partial.lengths) * partial.slot_size
+
+    def _expire(self):
+        if not self._partials:
+            return
+        cutoff = time.monotonic() - self.timeout
+        for key in [k for k, p in self._partials.items() if p.created < cutoff]:
+            self._discard(key)
+            self.dropped += 1
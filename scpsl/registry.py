@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+预设服务器注册表
+从JSON配置文件加载分组的预设服务器，文件修改时间变化后自动重新加载
+地址解析和/servers、/xy回复中不变的部分在加载时预先生成
+"""
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+Address = Tuple[str, int]
+
+DEFAULT_PORT = 7777
+
+
+class PresetServer(NamedTuple):
+    """预设服务器，前三项与批量查询使用的 (ip, port, name) 一致"""
+    ip: str
+    port: int
+    name: str
+    group: str
+
+    @property
+    def address(self) -> Address:
+        return self.ip, self.port
+
+
+@dataclass(frozen=True)
+class ServerGroup:
+    name: str
+    icon: str
+    servers: Tuple[PresetServer, ...]
+
+
+class RegistryError(ValueError):
+    """配置文件格式错误"""
+
+
+def parse_address(text: str, default_port: int = DEFAULT_PORT) -> Address:
+    """把 "ip:端口" 或 "ip" 解析为 (ip, 端口)"""
+    host, sep, port_str = str(text).strip().rpartition(':')
+    if not sep:
+        host, port_str = port_str, ''
+    try:
+        port = int(port_str) if port_str else default_port
+    except ValueError:
+        raise RegistryError(f"无效的端口: {text}")
+    if not host or ' ' in host or not (1 <= port <= 65535):
+        raise RegistryError(f"无效的服务器地址: {text}")
+    return host, port
+
+
+def load_groups(config: dict) -> Tuple[ServerGroup, ...]:
+    """
+    解析配置，格式为
+    {"groups": [{"name": "分组名", "icon": "🌸", "servers": [{"name": "服务器名", "address": "ip:端口"}]}]}
+    """
+    groups = []
+    names = set()
+    for group in config.get("groups", []):
+        group_name = str(group.get("name") or "预设服务器")
+        servers = []
+        for entry in group.get("servers", []):
+            name = str(entry.get("name") or "").strip()
+            if not name:
+                raise RegistryError(f"分组 {group_name} 中有服务器缺少名称")
+            if name in names:
+                raise RegistryError(f"服务器名称重复: {name}")
+            names.add(name)
+            ip, port = parse_address(entry.get("address", ""))
+            servers.append(PresetServer(ip, port, name, group_name))
+        groups.append(ServerGroup(group_name, str(group.get("icon") or "🎮"), tuple(servers)))
+    return tuple(groups)
+
+
+class ServerRegistry:
+    """
+    预设服务器注册表
+    - refresh()最多每check_interval秒检查一次文件修改时间，变化时重新加载
+    - 新配置有错误时保留当前配置并记录日志
+    - version在每次成功加载后递增，可用于让依赖配置的缓存失效
+    """
+
+    def __init__(self, path: str, check_interval: float = 2.0, logger: Optional[logging.Logger] = None):
+        self.path = path
+        self.check_interval = check_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.version = 0
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._apply(())
+
+    def refresh(self) -> bool:
+        """配置文件有变化时重新加载，返回是否加载了新配置"""
+        now = time.monotonic()
+        if self._checked and now - self._checked < self.check_interval:
+            return False
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            if self._mtime is not None:
+                self.logger.error(f"预设服务器配置文件不存在: {self.path}，继续使用当前配置")
+                self._mtime = None
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        return self.load()
+
+    def load(self) -> bool:
+        """立即从文件加载配置"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                groups = load_groups(json.load(f))
+        except (OSError, ValueError) as e:
+            self.logger.error(f"加载预设服务器配置失败: {e}")
+            return False
+        self._apply(groups)
+        self.logger.info(f"已加载 {len(self.servers)} 个预设服务器")
+        return True
+
+    def find(self, name: str) -> Optional[PresetServer]:
+        return self._by_name.get(name)
+
+    def _apply(self, groups: Tuple[ServerGroup, ...]):
+        self.groups = groups
+        self.servers: Tuple[PresetServer, ...] = tuple(s for g in groups for s in g.servers)
+        self.addresses: List[Address] = [s.address for s in self.servers]
+        self._by_name: Dict[str, PresetServer] = {s.name: s for s in self.servers}
+        self.servers_text = self._render_servers_text()
+        # /xy回复的固定部分：分组标题行与每个服务器所在的行
+        # 元素为 (固定文本, None) 或 (服务器名称前缀, 服务器)，渲染时只需填入状态
+        self.overview_layout: List[Tuple[str, Optional[PresetServer]]] = []
+        for group in groups:
+            if len(groups) > 1:
+                self.overview_layout.append((f"{group.icon} {group.name}\n", None))
+            for server in group.servers:
+                self.overview_layout.append((f"{server.name} [", server))
+        self.version += 1
+
+    def _render_servers_text(self) -> str:
+        text = "🎮 SCP:SL 服务器列表\n\n"
+        for group in self.groups:
+            text += f"{group.icon} {group.name}:\n"
+            for server in group.servers:
+                text += f"• {server.name}: {server.ip}:{server.port}\n"
+            text += "\n"
+        text += "📝 使用方法:\n"
+        text += "• /xy - 查询所有预设服务器状态\n"
+        text += "• /cx <IP:端口> - 查询自定义服务器"
+        return text
+
+    def __len__(self) -> int:
+        return len(self.servers)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+主机名解析
+通过事件循环的getaddrinfo异步解析，结果（包括解析失败）按TTL缓存，
+同一主机名同时只会有一次解析在进行，轮询和批量查询不会为每个数据包重复解析
+"""
+
+import asyncio
+import ipaddress
+import socket
+import time
+from typing import Dict, Optional, Tuple
+
+# 解析结果的缓存时间（秒）；getaddrinfo不提供记录的TTL，使用固定值
+DNS_TTL = 300.0
+
+# 解析失败的缓存时间（秒），避免不存在的域名在每次查询时都重新解析
+DNS_NEGATIVE_TTL = 30.0
+
+
+class HostResolver:
+    """
+    把主机名解析为IPv4地址
+    - IPv4地址字面量直接返回，不查缓存
+    - 成功结果缓存ttl秒，失败缓存negative_ttl秒，期间直接返回结果或抛出OSError
+    - 最多缓存max_entries个主机名，超出时淘汰最早加入的主机名
+    """
+
+    def __init__(self, ttl: float = DNS_TTL, negative_ttl: float = DNS_NEGATIVE_TTL, max_entries: int = 4096):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # 主机名 -> (地址, 失败原因, 过期时间)，地址与失败原因只有一个不为None
+        self._entries: Dict[str, Tuple[Optional[str], Optional[str], float]] = {}
+        # 主机名 -> 进行中的解析
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 缓存命中次数、实际解析次数、解析失败次数
+        self.hits = 0
+        self.lookups = 0
+        self.failures = 0
+
+    async def resolve(self, host: str, timeout: Optional[float] = None) -> str:
+        """返回host对应的IPv4地址，无法解析时抛出OSError，超过timeout秒抛出asyncio.TimeoutError"""
+        try:
+            return str(ipaddress.IPv4Address(host))
+        except ValueError:
+            pass
+
+        key = host.strip().lower()
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > time.monotonic():
+            self.hits += 1
+            if entry[0] is None:
+                raise OSError(entry[1])
+            return entry[0]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._lookup(key))
+            # 所有等待者都超时后仍由这里取走异常，避免未处理异常警告
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[key] = future
+        # shield：某个调用者超时或被取消时，解析继续进行并写入缓存
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    def _put(self, key: str, address: Optional[str], error: Optional[str], ttl: float):
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (address, error, time.monotonic() + ttl)
+
+    async def _lookup(self, key: str) -> str:
+        self.lookups += 1
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                key, None, family=socket.AF_INET, type=socket.SOCK_DGRAM
+            )
+            if not infos:
+                raise OSError(f"无法解析主机名: {key}")
+        except OSError as e:
+            self.failures += 1
+            error = f"无法解析主机名: {key}" if isinstance(e, socket.gaierror) else str(e)
+            self._put(key, None, error, self.negative_ttl)
+            raise OSError(error) from e
+        finally:
+            self._inflight.pop(key, None)
+
+        address = infos[0][4][0]
+        self._put(key, address, None, self.ttl)
+        return address
+
+    def __len__(self) -> int:
+        return len(self._entries)
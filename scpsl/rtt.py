@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+按端点估算往返时间
+与TCP的RTO计算方式相同（RFC 6298）：平滑RTT加4倍RTT偏差，并限制在上下限之内
+查询引擎据此决定等待多久重发请求，以及何时判定服务器无响应
+"""
+
+from typing import Dict, Hashable, Optional
+
+# RTT偏差项的下限（秒），避免RTT非常稳定时RTO贴着SRTT导致误重发
+CLOCK_GRANULARITY = 0.01
+
+
+class RttEstimator:
+    """单个端点的RTT估算"""
+
+    __slots__ = ("srtt", "rttvar", "rto")
+
+    def __init__(self, initial_rto: float):
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.rto = initial_rto
+
+
+class RttTable:
+    """
+    所有端点的RTT估算
+    - 端点为 (ip, 端口)，同时按ip汇总一份估算
+    - 尚无样本的端点使用同一ip的估算（同一主机的网络路径相同），都没有时使用initial_rto
+    - RTO始终限制在 [min_rto, max_rto] 之内
+    - 最多记录max_endpoints个端点，超出时淘汰最早加入的端点
+    """
+
+    def __init__(
+        self,
+        initial_rto: float = 1.0,
+        min_rto: float = 0.1,
+        max_rto: float = 3.0,
+        max_endpoints: int = 4096,
+    ):
+        self.initial_rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.max_endpoints = max_endpoints
+        self._estimators: Dict[Hashable, RttEstimator] = {}
+
+    def rto(self, endpoint: Hashable) -> float:
+        """端点当前的重发超时（秒）"""
+        estimator = self._estimators.get(endpoint) or self._estimators.get(_host(endpoint))
+        return self._clamp(self.initial_rto if estimator is None else estimator.rto)
+
+    def srtt(self, endpoint: Hashable) -> Optional[float]:
+        """端点的平滑RTT，尚无样本时返回None"""
+        estimator = self._estimators.get(endpoint)
+        return None if estimator is None else estimator.srtt
+
+    def known(self, endpoint: Hashable) -> bool:
+        """端点本身或同一ip的其他端点是否有过RTT样本"""
+        return self._sampled(endpoint) is not None
+
+    def observe(self, endpoint: Hashable, sample: float):
+        """记录一个RTT样本，同时清除之前的退避"""
+        host = _host(endpoint)
+        if host is not None:
+            self._update(self._get(host), sample)
+        self._update(self._get(endpoint), sample)
+
+    def _update(self, estimator: RttEstimator, sample: float):
+        if estimator.srtt is None:
+            estimator.srtt = sample
+            estimator.rttvar = sample / 2
+        else:
+            estimator.rttvar = 0.75 * estimator.rttvar + 0.25 * abs(estimator.srtt - sample)
+            estimator.srtt = 0.875 * estimator.srtt + 0.125 * sample
+        estimator.rto = self._clamp(estimator.srtt + max(CLOCK_GRANULARITY, 4 * estimator.rttvar))
+
+    def backoff(self, endpoint: Hashable):
+        """
+        请求最终未得到回复：RTO改为估算值的两倍（不超过max_rto），直到下一个有效样本
+        连续失败不会继续加倍，否则离线服务器的每次查询会越来越慢，最终拖满整个超时
+        """
+        estimator = self._sampled(endpoint)
+        if estimator is None:
+            base = self.initial_rto
+        else:
+            base = estimator.srtt + max(CLOCK_GRANULARITY, 4 * estimator.rttvar)
+        self._get(endpoint).rto = self._clamp(base * 2)
+
+    def _sampled(self, endpoint: Hashable) -> Optional[RttEstimator]:
+        """有样本的估算：先找端点本身，再找同一ip；退避会为无样本的端点建立估算，不能只看是否存在"""
+        for key in (endpoint, _host(endpoint)):
+            estimator = self._estimators.get(key)
+            if estimator is not None and estimator.srtt is not None:
+                return estimator
+        return None
+
+    def _get(self, endpoint: Hashable) -> RttEstimator:
+        estimator = self._estimators.get(endpoint)
+        if estimator is None:
+            if len(self._estimators) >= self.max_endpoints:
+                del self._estimators[next(iter(self._estimators))]
+            estimator = self._estimators[endpoint] = RttEstimator(self.initial_rto)
+        return estimator
+
+    def _clamp(self, rto: float) -> float:
+        return min(self.max_rto, max(self.min_rto, rto))
+
+    def __len__(self) -> int:
+        return len(self._estimators)
+
+
+def _host(endpoint: Hashable) -> Optional[str]:
+    """(ip, 端口) 形式的端点对应的ip"""
+    if isinstance(endpoint, tuple) and len(endpoint) == 2:
+        return endpoint[0]
+    return None
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite数据访问层
+持有一个WAL模式的长连接，所有数据库操作都在专用线程上执行，不阻塞事件循环
+"""
+
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+# 所有SQL都是固定字符串，sqlite3会在连接上缓存编译好的语句
+_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS group_servers (
+        group_id TEXT PRIMARY KEY,
+        server_ip TEXT NOT NULL,
+        server_port INTEGER DEFAULT 7777,
+        server_name TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # /groups按绑定时间倒序分页，(created_at, group_id)唯一确定一行的位置
+    'CREATE INDEX IF NOT EXISTS idx_group_servers_created_at ON group_servers (created_at, group_id)',
+    # 按地址过滤时端口作为附加条件，只按IP过滤时同样可以按顺序读取索引
+    'CREATE INDEX IF NOT EXISTS idx_group_servers_address ON group_servers (server_ip, created_at, group_id, server_port)',
+    '''
+    CREATE TABLE IF NOT EXISTS admin_users (
+        openid TEXT PRIMARY KEY,
+        username TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        created_by TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS server_samples (
+        address TEXT NOT NULL,
+        ts REAL NOT NULL,
+        players INTEGER NOT NULL,
+        ping INTEGER NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_server_samples_address_ts ON server_samples (address, ts)',
+    'CREATE INDEX IF NOT EXISTS idx_server_samples_ts ON server_samples (ts)',
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        level TEXT PRIMARY KEY,
+        watermark REAL NOT NULL
+    )
+    ''',
+)
+
+# 人数历史汇总级别：(表名, 桶宽秒数)，每一级由上一级（第一级由原始样本）汇总而来
+ROLLUP_LEVELS = (
+    ('server_rollup_1m', 60),
+    ('server_rollup_1h', 3600),
+    ('server_rollup_1d', 86400),
+)
+
+for _table, _ in ROLLUP_LEVELS:
+    _SCHEMA += (
+        f'''
+        CREATE TABLE IF NOT EXISTS {_table} (
+            address TEXT NOT NULL,
+            bucket REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            online INTEGER NOT NULL,
+            min_players INTEGER,
+            max_players INTEGER,
+            sum_players INTEGER NOT NULL,
+            PRIMARY KEY (address, bucket)
+        )
+        ''',
+        f'CREATE INDEX IF NOT EXISTS idx_{_table}_bucket ON {_table} (bucket)',
+    )
+
+_SELECT_ADMIN_OPENIDS = 'SELECT openid FROM admin_users'
+_SELECT_ADMIN = 'SELECT openid FROM admin_users WHERE openid = ?'
+_SELECT_ADMINS = 'SELECT openid, username, created_at, created_by FROM admin_users ORDER BY created_at'
+_UPSERT_ADMIN = 'INSERT OR REPLACE INTO admin_users (openid, username, created_by) VALUES (?, ?, ?)'
+_INSERT_ADMIN = 'INSERT INTO admin_users (openid, username, created_at, created_by) VALUES (?, ?, ?, ?)'
+_DELETE_ADMIN = 'DELETE FROM admin_users WHERE openid = ?'
+
+_SELECT_GROUP_SERVER = 'SELECT server_ip, server_port, server_name FROM group_servers WHERE group_id = ?'
+_SELECT_ALL_BINDINGS = 'SELECT group_id, server_ip, server_port, server_name FROM group_servers'
+_UPSERT_GROUP_SERVER = '''
+    INSERT OR REPLACE INTO group_servers
+    (group_id, server_ip, server_port, server_name, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+'''
+_DELETE_GROUP_SERVER = 'DELETE FROM group_servers WHERE group_id = ?'
+
+# /groups分页：按 (created_at, group_id) 倒序，地址过滤条件的参数个数 -> 条件
+# 先在索引上跳过前面的页找到本页起点（只读索引），再从起点按键集取出一页
+_GROUP_FILTERS = {
+    0: '1',
+    1: 'server_ip = ?',
+    2: 'server_ip = ? AND server_port = ?',
+}
+_SEEK_GROUP_PAGE = {
+    n: f'''
+    SELECT created_at, group_id FROM group_servers WHERE {condition}
+    ORDER BY created_at DESC, group_id DESC LIMIT 1 OFFSET ?
+    '''
+    for n, condition in _GROUP_FILTERS.items()
+}
+_SELECT_GROUP_PAGE = {
+    (n, after): f'''
+    SELECT group_id, server_ip, server_port, server_name, created_at FROM group_servers
+    WHERE {condition}{" AND (created_at, group_id) <= (?, ?)" if after else ""}
+    ORDER BY created_at DESC, group_id DESC LIMIT ?
+    '''
+    for n, condition in _GROUP_FILTERS.items()
+    for after in (False, True)
+}
+
+_INSERT_SAMPLE = 'INSERT INTO server_samples (address, ts, players, ping) VALUES (?, ?, ?, ?)'
+
+_SELECT_WATERMARK = 'SELECT watermark FROM rollup_state WHERE level = ?'
+_UPSERT_WATERMARK = 'INSERT OR REPLACE INTO rollup_state (level, watermark) VALUES (?, ?)'
+
+# 汇总行格式：(桶起始时间, 样本数, 在线样本数, 最低人数, 最高人数, 人数总和)
+# 原始样本中players为-1表示离线
+_RAW_AGGREGATE = '''
+    SELECT address, CAST(ts / {width} AS INTEGER) * {width}, COUNT(*), SUM(players >= 0),
+           MIN(CASE WHEN players >= 0 THEN players END), MAX(CASE WHEN players >= 0 THEN players END),
+           SUM(CASE WHEN players >= 0 THEN players ELSE 0 END)
+    FROM server_samples WHERE ts >= ? AND ts < ?
+    GROUP BY 1, 2
+'''
+_ROLLUP_AGGREGATE = '''
+    SELECT address, CAST(bucket / {width} AS INTEGER) * {width}, SUM(samples), SUM(online),
+           MIN(min_players), MAX(max_players), SUM(sum_players)
+    FROM {source} WHERE bucket >= ? AND bucket < ?
+    GROUP BY 1, 2
+'''
+# 重复汇总同一个桶时合并统计值（正常情况下水位线保证每个桶只汇总一次）
+_INSERT_ROLLUP = '''
+    INSERT INTO {table} (address, bucket, samples, online, min_players, max_players, sum_players)
+    {select}
+    ON CONFLICT (address, bucket) DO UPDATE SET
+        samples = samples + excluded.samples,
+        online = online + excluded.online,
+        min_players = COALESCE(min(min_players, excluded.min_players), min_players, excluded.min_players),
+        max_players = COALESCE(max(max_players, excluded.max_players), max_players, excluded.max_players),
+        sum_players = sum_players + excluded.sum_players
+'''
+_SOURCES = (('server_samples', 'ts'),) + tuple((table, 'bucket') for table, _ in ROLLUP_LEVELS)
+_INSERT_ROLLUPS = tuple(
+    _INSERT_ROLLUP.format(
+        table=table,
+        select=_RAW_AGGREGATE.format(width=width) if i == 0
+        else _ROLLUP_AGGREGATE.format(width=width, source=ROLLUP_LEVELS[i - 1][0]),
+    )
+    for i, (table, width) in enumerate(ROLLUP_LEVELS)
+)
+_SELECT_FIRST = tuple(f'SELECT MIN({column}) FROM {table}' for table, column in _SOURCES)
+_PURGE = tuple(
+    f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?)'
+    for table, column in _SOURCES
+)
+_SELECT_HISTORY = (
+    '''
+    SELECT ts, 1, players >= 0, CASE WHEN players >= 0 THEN players END,
+           CASE WHEN players >= 0 THEN players END, MAX(players, 0)
+    FROM server_samples WHERE address = ? AND ts >= ? AND ts < ? ORDER BY ts
+    ''',
+) + tuple(
+    f'''
+    SELECT bucket, samples, online, min_players, max_players, sum_players
+    FROM {table} WHERE address = ? AND bucket >= ? AND bucket < ? ORDER BY bucket
+    '''
+    for table, _ in ROLLUP_LEVELS
+)
+
+
+class Storage:
+    """
+    group_servers.db的访问入口
+    异步方法把操作提交到单个数据库线程执行；*_sync方法会阻塞调用线程，只在插件加载时使用
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scpsl-db")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # ---- 生命周期 ----
+
+    def open_sync(self):
+        """打开连接并建表"""
+        self._executor.submit(self._open).result()
+
+    async def close(self):
+        """关闭连接并停止数据库线程"""
+        await self._call(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _open(self):
+        # 连接只在数据库线程上使用
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # ---- 管理员 ----
+
+    def load_admin_openids_sync(self) -> List[str]:
+        return self._executor.submit(self._load_admin_openids).result()
+
+    def ensure_admin_sync(self, openid: str, username: str) -> bool:
+        """确保管理员存在，新插入时返回True"""
+        return self._executor.submit(self._ensure_admin, openid, username).result()
+
+    async def list_admins(self) -> List[Tuple[str, str, str, str]]:
+        return await self._call(self._list_admins)
+
+    async def add_admin(self, openid: str, username: Optional[str], created_by: Optional[str]):
+        await self._call(self._add_admin, openid, username, created_by)
+
+    async def remove_admin(self, openid: str):
+        await self._call(self._remove_admin, openid)
+
+    def _load_admin_openids(self) -> List[str]:
+        return [row[0] for row in self._conn.execute(_SELECT_ADMIN_OPENIDS)]
+
+    def _ensure_admin(self, openid: str, username: str) -> bool:
+        with self._conn:
+            if self._conn.execute(_SELECT_ADMIN, (openid,)).fetchone():
+                return False
+            self._conn.execute(
+                _INSERT_ADMIN,
+                (openid, username, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'system'),
+            )
+            return True
+
+    def _list_admins(self):
+        return self._conn.execute(_SELECT_ADMINS).fetchall()
+
+    def _add_admin(self, openid, username, created_by):
+        with self._conn:
+            self._conn.execute(_UPSERT_ADMIN, (openid, username, created_by))
+
+    def _remove_admin(self, openid):
+        with self._conn:
+            self._conn.execute(_DELETE_ADMIN, (openid,))
+
+    # ---- 群聊绑定 ----
+
+    def load_group_servers_sync(self) -> List[Tuple[str, str, int, Optional[str]]]:
+        """读取全部绑定 (group_id, server_ip, server_port, server_name)"""
+        return self._executor.submit(self._load_group_servers).result()
+
+    async def set_group_server(self, group_id: str, server_ip: str, server_port: int, server_name: Optional[str]):
+        await self._call(self._set_group_server, group_id, server_ip, server_port, server_name)
+
+    async def delete_group_server(self, group_id: str) -> Optional[Tuple[str, str, int]]:
+        """删除群聊绑定，返回被删除的 (server_name, server_ip, server_port)，未绑定时返回None"""
+        return await self._call(self._delete_group_server, group_id)
+
+    async def list_group_servers_page(
+        self,
+        page: int,
+        page_size: int,
+        server_ip: Optional[str] = None,
+        server_port: Optional[int] = None,
+    ) -> List[Tuple[str, str, int, str, str]]:
+        """
+        按绑定时间倒序读取第page页（从1开始）的 (group_id, server_ip, server_port, server_name, created_at)
+        可按服务器IP（及端口）过滤，超出范围时返回空列表
+        """
+        return await self._call(self._list_group_servers_page, page, page_size, server_ip, server_port)
+
+    def _load_group_servers(self):
+        return self._conn.execute(_SELECT_ALL_BINDINGS).fetchall()
+
+    def _set_group_server(self, group_id, server_ip, server_port, server_name):
+        with self._conn:
+            self._conn.execute(_UPSERT_GROUP_SERVER, (group_id, server_ip, server_port, server_name))
+
+    def _delete_group_server(self, group_id):
+        with self._conn:
+            row = self._conn.execute(_SELECT_GROUP_SERVER, (group_id,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(_DELETE_GROUP_SERVER, (group_id,))
+        server_ip, server_port, server_name = row
+        return server_name, server_ip, server_port
+
+    def _list_group_servers_page(self, page, page_size, server_ip, server_port):
+        params = () if server_ip is None else (server_ip,) if server_port is None else (server_ip, server_port)
+        start = ()
+        if page > 1:
+            row = self._conn.execute(_SEEK_GROUP_PAGE[len(params)], params + ((page - 1) * page_size,)).fetchone()
+            if row is None:
+                return []
+            start = tuple(row)
+        return self._conn.execute(
+            _SELECT_GROUP_PAGE[len(params), bool(start)], params + start + (page_size,)
+        ).fetchall()
+
+    # ---- 人数历史 ----
+
+    async def insert_samples(self, rows: List[Tuple[str, float, int, int]]):
+        """在一个事务中批量写入 (address, ts, players, ping) 样本"""
+        await self._call(self._insert_samples, rows)
+
+    def _insert_samples(self, rows):
+        with self._conn:
+            self._conn.executemany(_INSERT_SAMPLE, rows)
+
+    async def compact_step(self, level: int, now: float, lag: float, max_buckets: int = 60) -> bool:
+        """
+        把第level级汇总向前推进最多max_buckets个桶，使用一个小事务
+        第一级只汇总lag秒之前的原始样本，给延迟写入留出时间
+        返回是否还有待汇总的数据
+        """
+        return await self._call(self._compact_step, level, now, lag, max_buckets)
+
+    async def purge_step(self, source: int, before: float, limit: int = 5000) -> int:
+        """
+        删除第source个数据源（0为原始样本，1起为各级汇总）中早于before的最多limit行
+        只会删除已被下一级汇总过的数据，返回删除的行数
+        """
+        return await self._call(self._purge_step, source, before, limit)
+
+    async def query_history(self, address: str, start: float, end: float, source: int) -> List[Tuple]:
+        """按汇总行格式读取一个数据源中 [start, end) 的历史"""
+        return await self._call(self._query_history, address, start, end, source)
+
+    def _watermark(self, level: int) -> Optional[float]:
+        row = self._conn.execute(_SELECT_WATERMARK, (ROLLUP_LEVELS[level][0],)).fetchone()
+        return row[0] if row else None
+
+    def _compact_step(self, level, now, lag, max_buckets):
+        table, width = ROLLUP_LEVELS[level]
+        if level == 0:
+            limit = now - lag
+        else:
+            limit = self._watermark(level - 1)
+            if limit is None:
+                return False
+        limit = (limit // width) * width
+
+        watermark = self._watermark(level)
+        if watermark is None:
+            first = self._conn.execute(_SELECT_FIRST[level]).fetchone()[0]
+            if first is None:
+                return False
+            watermark = (first // width) * width
+
+        end = min(watermark + width * max_buckets, limit)
+        if end <= watermark:
+            return False
+        with self._conn:
+            self._conn.execute(_INSERT_ROLLUPS[level], (watermark, end))
+            self._conn.execute(_UPSERT_WATERMARK, (table, end))
+        return end < limit
+
+    def _purge_step(self, source, before, limit):
+        # 数据必须先被下一级汇总才能删除
+        rolled = self._watermark(source) if source < len(ROLLUP_LEVELS) else None
+        if rolled is None:
+            return 0
+        with self._conn:
+            return self._conn.execute(_PURGE[source], (min(before, rolled), limit)).rowcount
+
+    def _query_history(self, address, start, end, source):
+        return self._conn.execute(_SELECT_HISTORY[source], (address, start, end)).fetchall()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+批量查询目标解析
+把 "ip"、"ip:端口"、"ip:起始端口-结束端口"、"网段/前缀[:端口或端口范围]" 展开为 (ip, 端口) 列表
+展开前先计算数量，超过上限时直接报错，不会为过大的网段或端口范围生成列表
+"""
+
+import ipaddress
+import re
+from typing import Iterable, List, Optional, Tuple
+
+Address = Tuple[str, int]
+
+# 主机名的一段：字母、数字和连字符，不以连字符开头或结尾
+_HOSTNAME_LABEL = re.compile(r"(?!-)[A-Za-z0-9-]{1,63}(?<!-)")
+
+
+class TargetError(ValueError):
+    """目标格式错误或数量超过上限"""
+
+
+def parse_ports(text: str, default_port: int) -> range:
+    """解析 "端口" 或 "起始端口-结束端口"，为空时使用default_port"""
+    if not text:
+        return range(default_port, default_port + 1)
+    start_str, sep, end_str = text.partition('-')
+    try:
+        start = int(start_str)
+        end = int(end_str) if sep else start
+    except ValueError:
+        raise TargetError(f"无效的端口: {text}")
+    if not (1 <= start <= end <= 65535):
+        raise TargetError(f"无效的端口范围: {text}")
+    return range(start, end + 1)
+
+
+def _is_host(text: str) -> bool:
+    """是否为IPv4地址或合法的主机名；最后一段全是数字的不是主机名，多半是写错的IP地址"""
+    try:
+        ipaddress.IPv4Address(text)
+        return True
+    except ValueError:
+        pass
+    labels = text[:-1].split('.') if text.endswith('.') else text.split('.')
+    if len(text) > 253 or not all(_HOSTNAME_LABEL.fullmatch(label) for label in labels):
+        return False
+    return not labels[-1].isdigit()
+
+
+def _parse_hosts(text: str) -> Tuple[Optional[ipaddress.IPv4Network], int]:
+    """返回 (网段, 主机数)，单个地址的网段为None；网段在确认总数不超限后才展开"""
+    if '/' not in text:
+        if not text or ' ' in text:
+            raise TargetError(f"无效的服务器地址: {text}")
+        if text.strip('[]').isdigit():
+            # 多半是把端口单独写成了一个参数
+            raise TargetError(f"无效的服务器地址: {text}，端口请写成 地址:端口")
+        if not _is_host(text):
+            raise TargetError(f"无效的服务器地址: {text}")
+        return None, 1
+    try:
+        network = ipaddress.IPv4Network(text, strict=False)
+    except ValueError:
+        raise TargetError(f"无效的网段: {text}")
+    # /31和/32没有网络地址和广播地址
+    count = network.num_addresses if network.prefixlen >= 31 else network.num_addresses - 2
+    return network, count
+
+
+def expand_targets(tokens: Iterable[str], default_port: int, max_targets: int) -> List[Address]:
+    """
+    展开所有目标，保持输入顺序并去重
+    目标总数超过max_targets时抛出TargetError
+    """
+    specs = []
+    total = 0
+    for token in tokens:
+        for part in token.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            host, sep, port_text = part.rpartition(':')
+            if not sep:
+                host, port_text = port_text, ''
+            if ':' in host:
+                raise TargetError(f"无效的服务器地址: {part}（不支持IPv6）")
+            ports = parse_ports(port_text, default_port)
+            network, count = _parse_hosts(host)
+            total += count * len(ports)
+            if total > max_targets:
+                raise TargetError(f"目标过多，一次最多查询{max_targets}个服务器")
+            specs.append((host, network, ports))
+
+    # dict保持插入顺序，用于去重
+    targets = {}
+    for host, network, ports in specs:
+        if network is None:
+            hosts = [host]
+        elif network.prefixlen >= 31:
+            hosts = [str(ip) for ip in network]
+        else:
+            hosts = [str(ip) for ip in network.hosts()]
+        for ip in hosts:
+            for port in ports:
+                targets.setdefault((ip, port), None)
+    return list(targets)
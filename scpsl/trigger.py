@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+关键词触发
+每条群消息都要检查一遍，因此匹配必须足够便宜：
+所有关键词合并为一个纯字面量的正则，一次扫描即可判断是否包含任一关键词，不会回溯
+"""
+
+import re
+from typing import Iterable, Optional
+
+
+class KeywordMatcher:
+    """判断文本中是否包含任一关键词（子串匹配，区分大小写）"""
+
+    def __init__(self, keywords: Iterable[str]):
+        # 去重并保留配置顺序
+        self.keywords = tuple(dict.fromkeys(k for k in keywords if k))
+        self._pattern = None
+        if self.keywords:
+            # 长的关键词放在前面，使search()返回最完整的匹配
+            alternatives = sorted(self.keywords, key=len, reverse=True)
+            self._pattern = re.compile("|".join(re.escape(k) for k in alternatives))
+
+    def search(self, text: Optional[str]) -> Optional[str]:
+        """返回文本中第一个出现的关键词，没有则返回None"""
+        if not text or self._pattern is None:
+            return None
+        match = self._pattern.search(text)
+        return match.group(0) if match else None
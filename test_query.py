@@ -6,11 +6,15 @@
 不依赖astrbot框架
 """
 
+import os
 import socket
 import struct
 import asyncio
 import time
-from typing import Dict, Any
+from typing import Optional
+
+from scpsl.parser import A2SError, ServerInfo, parse_info
+from scpsl.registry import ServerRegistry
 
 class SCPSLQueryTester:
     """SCPSL服务器查询测试器"""
@@ -18,7 +22,7 @@ class SCPSLQueryTester:
     def __init__(self):
         self.timeout = 5.0
     
-    async def _query_server_tcp(self, ip: str, port: int) -> Dict[str, Any]:
+    async def _query_server_tcp(self, ip: str, port: int) -> Optional[ServerInfo]:
         """使用支持challenge的A2S协议查询服务器信息"""
         # 尝试多个可能的查询端口
         query_ports = [port, port + 1, port - 1]
@@ -68,9 +72,11 @@ class SCPSLQueryTester:
                 # 解析A2S_INFO响应
                 if len(response) >= 5 and response[4] == 0x49:  # A2S_INFO response
                     print(f"📋 收到A2S_INFO响应，端口: {query_port}")
-                    result = self._parse_a2s_info(response[5:], ping)
-                    if result.get('status') == 'online':
-                        return result
+                    return parse_info(response, ping)
+                
+            except A2SError as e:
+                print(f"❌ 解析A2S响应失败 {ip}:{query_port}: {str(e)}")
+                continue
                 
             except socket.timeout:
                 print(f"⏰ 查询超时: {ip}:{query_port}")
@@ -89,130 +95,25 @@ class SCPSLQueryTester:
                     except:
                         pass
         
-        # 如果所有端口都失败，返回错误
-        return {'status': 'offline', 'error': '无法连接到服务器'}
-    
-    def _parse_a2s_info(self, data: bytes, ping: int) -> Dict[str, Any]:
-        """解析A2S_INFO响应数据"""
-        try:
-            offset = 0
-            
-            # 协议版本
-            protocol = data[offset]
-            offset += 1
-            
-            # 服务器名称
-            server_name_end = data.find(b'\x00', offset)
-            server_name = data[offset:server_name_end].decode('utf-8', errors='ignore')
-            offset = server_name_end + 1
-            
-            # 地图名称
-            map_name_end = data.find(b'\x00', offset)
-            map_name = data[offset:map_name_end].decode('utf-8', errors='ignore')
-            offset = map_name_end + 1
-            
-            # 文件夹名称
-            folder_end = data.find(b'\x00', offset)
-            folder = data[offset:folder_end].decode('utf-8', errors='ignore')
-            offset = folder_end + 1
-            
-            # 游戏名称
-            game_end = data.find(b'\x00', offset)
-            game = data[offset:game_end].decode('utf-8', errors='ignore')
-            offset = game_end + 1
-            
-            # 应用ID
-            if offset + 2 <= len(data):
-                app_id = struct.unpack('<H', data[offset:offset+2])[0]
-                offset += 2
-            else:
-                app_id = 0
-            
-            # 玩家数量
-            if offset < len(data):
-                players = data[offset]
-                offset += 1
-            else:
-                players = 0
-            
-            # 最大玩家数
-            if offset < len(data):
-                max_players = data[offset]
-                offset += 1
-            else:
-                max_players = 20
-            
-            # 机器人数量
-            if offset < len(data):
-                bots = data[offset]
-                offset += 1
-            else:
-                bots = 0
-            
-            # 服务器类型
-            if offset < len(data):
-                server_type = chr(data[offset])
-                offset += 1
-            else:
-                server_type = 'd'
-            
-            # 平台
-            if offset < len(data):
-                platform = chr(data[offset])
-                offset += 1
-            else:
-                platform = 'l'
-            
-            # 是否需要密码
-            if offset < len(data):
-                password = bool(data[offset])
-                offset += 1
-            else:
-                password = False
-            
-            # VAC状态
-            if offset < len(data):
-                vac = bool(data[offset])
-                offset += 1
-            else:
-                vac = False
-            
-            return {
-                'status': 'online',
-                'players': players,
-                'max_players': max_players,
-                'server_name': server_name,
-                'map': map_name,
-                'game_mode': game if game else '未知模式',
-                'round_time': '未知',
-                'ping': ping,
-                'bots': bots,
-                'password': password,
-                'vac': vac
-            }
-            
-        except Exception as e:
-            return {
-                'status': 'error',
-                'error': f'解析A2S响应失败: {str(e)}'
-            }
+        # 如果所有端口都失败，返回None
+        return None
     
     async def query_scpsl_server(self, ip: str, port: int) -> dict:
         """查询SCP:SL服务器信息（使用A2S协议）"""
         # 直接使用A2S协议查询
-        result = await self._query_server_tcp(ip, port)
+        info = await self._query_server_tcp(ip, port)
         
-        if result and result.get('status') == 'online':
+        if info is not None:
             # 转换为兼容格式
             return {
                 'online': True,
-                'ping': result.get('ping', 0),
-                'players': result.get('players', 0),
-                'max_players': result.get('max_players', 20),
-                'name': result.get('server_name', 'SCP:SL Server'),
-                'gamemode': result.get('game_mode', 'Classic'),
-                'map': result.get('map', 'Facility'),
-                'round_time': result.get('round_time', '00:00'),
+                'ping': info.ping,
+                'players': info.players,
+                'max_players': info.max_players,
+                'name': info.name,
+                'gamemode': info.game or '未知模式',
+                'map': info.map,
+                'round_time': '未知',
                 'version': 'Unknown'
             }
         else:
@@ -225,15 +126,10 @@ async def test_server_query():
     # 创建查询实例
     tester = SCPSLQueryTester()
     
-    # 测试服务器列表
-    test_servers = [
-        ("43.139.108.159", 8000, "椿雨纯净服#1"),
-        ("43.139.108.159", 8001, "椿雨纯净服#2"),
-        ("43.139.108.159", 8002, "椿雨插件服#1"),
-        ("43.139.108.159", 8003, "椿雨插件服#2"),
-        ("43.139.108.159", 7777, "椿雨萌新服"),
-        ("8.138.236.97", 5000, "银狼服务器")
-    ]
+    # 测试服务器列表：与插件使用同一份预设服务器配置
+    registry = ServerRegistry(os.path.join(os.path.dirname(os.path.abspath(__file__)), "servers.json"))
+    registry.load()
+    test_servers = [(ip, port, name) for ip, port, name, _ in registry.servers]
     
     successful_queries = 0
     total_queries = len(test_servers)
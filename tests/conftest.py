@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+离线测试：只依赖scpsl包和fake_a2s_server.py，不需要astrbot框架和真实服务器
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""有并发上限和总截止时间的批量执行"""
+
+import asyncio
+
+from scpsl import gather_bounded
+
+
+def test_results_keep_order_and_mark_errors_and_timeouts():
+    async def work(item):
+        if item == "boom":
+            raise ValueError(item)
+        await asyncio.sleep(1.0 if item == "slow" else 0.01)
+        return item.upper()
+
+    results = asyncio.run(gather_bounded(["a", "boom", "slow", "b"], work, 2, 0.2))
+    assert results[0] == "A"
+    assert isinstance(results[1], ValueError)
+    assert results[2] is None
+    assert results[3] == "B"
+
+
+def test_concurrency_limit():
+    running = peak = 0
+
+    async def work(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    asyncio.run(gather_bounded(range(20), work, 4, 5.0))
+    assert peak == 4
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""离线服务器熔断"""
+
+import pytest
+
+from scpsl import CircuitBreaker
+from scpsl import breaker as breaker_module
+
+KEY = ("10.0.0.1", 7777)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_threshold_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record(KEY, False)
+    assert breaker.allow(KEY)
+    breaker.record(KEY, False)
+    assert not breaker.allow(KEY)
+    assert breaker.state(KEY) == "open"
+    assert breaker.open_count == 1
+    assert breaker.short_circuited == 1
+
+
+def test_single_probe_after_backoff(clock):
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=10)
+    breaker.record(KEY, False)
+    assert not breaker.take_probe(KEY)
+    clock[0] += 10
+    assert breaker.take_probe(KEY)
+    assert not breaker.take_probe(KEY)
+    assert breaker.state(KEY) == "half_open"
+    assert not breaker.allow(KEY)
+
+
+def test_failed_probe_doubles_backoff_up_to_limit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=10, max_backoff=25)
+    breaker.record(KEY, False)
+    for wait in (10, 20, 25, 25):
+        clock[0] += wait - 0.1
+        assert not breaker.take_probe(KEY)
+        clock[0] += 0.1
+        assert breaker.take_probe(KEY)
+        breaker.record(KEY, False)
+
+
+def test_success_closes_and_forgets(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record(KEY, False)
+    clock[0] += 5
+    assert breaker.checked_ago(KEY) == 5
+    breaker.record(KEY, True)
+    assert breaker.allow(KEY)
+    assert breaker.checked_ago(KEY) is None
+
+
+def test_entry_limit_evicts_oldest(clock):
+    breaker = CircuitBreaker(failure_threshold=1, max_entries=2)
+    for port in (1, 2, 3):
+        breaker.record(("10.0.0.1", port), False)
+    assert breaker.allow(("10.0.0.1", 1))
+    assert not breaker.allow(("10.0.0.1", 3))
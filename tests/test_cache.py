@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""状态缓存：TTL、过期后后台刷新、合并并发查询与淘汰"""
+
+import asyncio
+
+from scpsl import StatusCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Source:
+    """每次调用返回递增的值，可选延迟"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.calls
+
+
+def test_fresh_hit_and_stale_refresh():
+    async def scenario():
+        cache = StatusCache(ttl=0.05, stale_ttl=1.0)
+        source = Source()
+        assert await cache.get("k", source) == 1
+        assert await cache.get("k", source) == 1
+        await asyncio.sleep(0.06)
+        # 过期但未超过stale_ttl：先返回旧结果，后台刷新
+        assert await cache.get("k", source) == 1
+        await asyncio.sleep(0.01)
+        assert await cache.get("k", source) == 2
+        return cache
+
+    cache = run(scenario())
+    assert (cache.hits, cache.stale_hits, cache.misses) == (2, 1, 1)
+
+
+def test_concurrent_gets_share_one_fetch():
+    async def scenario():
+        cache = StatusCache()
+        source = Source(delay=0.02)
+        results = await asyncio.gather(*(cache.get("k", source) for _ in range(10)))
+        return results, source.calls
+
+    assert run(scenario()) == ([1] * 10, 1)
+
+
+def test_cancelled_caller_does_not_cancel_shared_fetch():
+    async def scenario():
+        cache = StatusCache()
+        source = Source(delay=0.02)
+        first = asyncio.ensure_future(cache.get("k", source))
+        second = asyncio.ensure_future(cache.get("k", source))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert run(scenario()) == 1
+
+
+def test_put_prunes_expired_and_limits_entries():
+    async def scenario():
+        cache = StatusCache(ttl=0.02, stale_ttl=0.02, max_entries=3)
+        for key in range(5):
+            cache.put(key, key)
+        assert list(cache._entries) == [2, 3, 4]
+        cache.put(2, "again")
+        assert list(cache._entries) == [3, 4, 2]
+        await asyncio.sleep(0.05)
+        cache.put("new", 1)
+        return list(cache._entries)
+
+    assert run(scenario()) == ["new"]
+
+
+def test_cancel_stops_inflight_fetches():
+    async def scenario():
+        cache = StatusCache()
+        task = asyncio.ensure_future(cache.refresh("k", Source(delay=10)))
+        await asyncio.sleep(0)
+        await cache.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return cache.inflight, task.cancelled()
+
+    assert run(scenario()) == (0, True)
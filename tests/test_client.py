@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""A2SClient对本地模拟服务器（FakeFleet）的查询"""
+
+import asyncio
+
+import pytest
+
+from fake_a2s_server import FakeA2SServer, FakeFleet, FakeServerConfig
+from scpsl import A2SClient, A2SError, expand_targets, gather_bounded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def online_ports(targets, results):
+    return sorted(port for (_, port), result in zip(targets, results) if not isinstance(result, BaseException))
+
+
+def test_port_range_scan_reports_only_live_ports():
+    # 41000、41002、41004上有服务器，41001、41003、41005是空端口
+    async def scan():
+        fleet = await FakeFleet().start(3, 41000, FakeServerConfig())
+        client = A2SClient(timeout=1.0)
+        try:
+            targets = expand_targets(["127.0.0.1:41000-41005"], 7777, 64)
+            results = await gather_bounded(
+                targets, lambda t: client.query_server(*t, probe_neighbours=False), 8, 5.0
+            )
+            return targets, results
+        finally:
+            client.close()
+            fleet.close()
+
+    targets, results = run(scan())
+    assert online_ports(targets, results) == [41000, 41002, 41004]
+
+
+def test_neighbour_port_answers_for_game_port():
+    # 默认仍探测相邻端口：游戏端口41011没有服务器时由查询端口41010应答
+    async def query():
+        fleet = await FakeFleet().start(1, 41010, FakeServerConfig(name="neighbour"))
+        client = A2SClient(timeout=2.0)
+        try:
+            return await client.query_server("127.0.0.1", 41011)
+        finally:
+            client.close()
+            fleet.close()
+
+    assert run(query()).name == "neighbour"
+
+
+def test_memo_is_cleared_when_server_moves_to_game_port():
+    # 先只在41021（游戏端口41020的相邻端口）应答并被记住，之后服务器改到游戏端口本身
+    async def scenario():
+        client = A2SClient(timeout=3.0)
+        fleet = await FakeFleet().start(1, 41021, FakeServerConfig(name="old"))
+        try:
+            assert (await client.query_server("127.0.0.1", 41020)).name == "old"
+        finally:
+            fleet.close()
+        fleet = await FakeFleet().start(1, 41020, FakeServerConfig(name="moved"))
+        try:
+            return [(await client.query_server("127.0.0.1", 41020)).name for _ in range(2)]
+        finally:
+            client.close()
+            fleet.close()
+
+    assert run(scenario()) == ["moved", "moved"]
+
+
+def test_dead_server_is_detected_quickly_every_time():
+    async def scenario():
+        client = A2SClient(timeout=5.0)
+        fleet = await FakeFleet().start(1, 41030, FakeServerConfig())
+        await client.query_server("127.0.0.1", 41030)
+        fleet.close()
+        loop = asyncio.get_running_loop()
+        elapsed = []
+        try:
+            for _ in range(3):
+                started = loop.time()
+                try:
+                    await client.query_server("127.0.0.1", 41030)
+                except asyncio.TimeoutError:
+                    pass
+                elapsed.append(loop.time() - started)
+        finally:
+            client.close()
+        return elapsed
+
+    # 总超时为5秒；同一主机回复过，重发max_retries次后即判定离线
+    assert max(run(scenario())) < 2.0
+
+
+class _EchoChallengeServer(FakeA2SServer):
+    """不论请求带什么challenge都只回同一个challenge的异常服务器"""
+
+    def _handle(self, data):
+        return self._challenge()
+
+
+def test_server_echoing_same_challenge_is_not_flooded():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        transport, server = await loop.create_datagram_endpoint(
+            lambda: _EchoChallengeServer(FakeServerConfig()), local_addr=("127.0.0.1", 41040)
+        )
+        client = A2SClient(timeout=3.0)
+        try:
+            with pytest.raises((A2SError, asyncio.TimeoutError)):
+                await client.query_info("127.0.0.1", 41040)
+            return server.received
+        finally:
+            client.close()
+            transport.close()
+
+    # 修复前每收到一个重复challenge就再发一次，3秒内按RTT节奏发出上万个包
+    assert run(scenario()) < 20
+
+
+def test_details_reassemble_split_responses_and_reuse_challenge():
+    async def scenario():
+        config = FakeServerConfig(split_size=200, rules=40, players=20)
+        fleet = await FakeFleet().start(1, 41050, config)
+        client = A2SClient(timeout=2.0)
+        try:
+            first = await client.query_details("127.0.0.1", 41050)
+            challenges = client.challenges_received
+            second = await client.query_details("127.0.0.1", 41050)
+            return first, second, challenges, client.challenges_received
+        finally:
+            client.close()
+            fleet.close()
+
+    first, second, before, after = run(scenario())
+    assert len(first.players) == 20
+    assert len(first.rules) == 41
+    assert first.round_time == "00:05:23"
+    assert (second.players, second.rules) == (first.players, first.rules)
+    # 第二次查询直接带上缓存的challenge，不再多一次往返
+    assert before == after == 1
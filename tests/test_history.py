@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""人数历史：环形缓冲区、统计与延迟批量写入"""
+
+import asyncio
+import time
+
+from scpsl import HistoryStore, SampleWriter
+from scpsl.history import OFFLINE, SampleRing, summarize_rows
+
+ADDRESS = ("10.0.0.1", 7777)
+
+
+def test_ring_grows_then_wraps():
+    ring = SampleRing(4)
+    for ts in range(3):
+        ring.append(float(ts), ts, 10)
+    assert len(ring.ts) == 3
+    for ts in range(3, 7):
+        ring.append(float(ts), ts, 10)
+    assert len(ring) == 4
+    assert len(ring.ts) == 4
+    assert [ts for ts, _, _ in ring.since(0.0)] == [3.0, 4.0, 5.0, 6.0]
+    assert [ts for ts, _, _ in ring.since(4.5)] == [5.0, 6.0]
+
+
+def test_summarize_counts_offline_samples():
+    store = HistoryStore(capacity=100)
+    now = time.time()
+    for i in range(6):
+        store.record(ADDRESS, 10 + i, 20, now - 60 + i)
+    for i in range(12):
+        store.record(ADDRESS, OFFLINE, OFFLINE, now - 50 + i)
+    summary = store.summarize(ADDRESS, 3600)
+    assert (summary.samples, summary.online_samples) == (18, 6)
+    assert (summary.min_players, summary.max_players) == (10, 15)
+    assert summary.availability == 6 / 18
+
+
+def test_summarize_rows_sparkline_leaves_gaps_blank():
+    rows = [(0.0, 1, 1, 0, 0, 0), (90.0, 1, 1, 10, 10, 10)]
+    summary = summarize_rows(rows, 0.0, 100.0, width=10)
+    assert summary.sparkline == "▁" + " " * 8 + "█"
+    assert summarize_rows([], 0.0, 1.0) is None
+
+
+def test_store_evicts_oldest_server():
+    store = HistoryStore(capacity=10, max_servers=2)
+    for port in (1, 2, 3):
+        store.record(("10.0.0.1", port), 1, 1)
+    assert store.oldest(("10.0.0.1", 1)) is None
+    assert store.oldest(("10.0.0.1", 3)) is not None
+
+
+def test_sample_writer_batches_and_stops_after_close():
+    batches = []
+
+    async def write(rows):
+        batches.append(rows)
+
+    async def scenario():
+        writer = SampleWriter(write, flush_interval=10, batch_size=3)
+        for i in range(3):
+            writer.add(ADDRESS, float(i), i, 10)
+        await asyncio.sleep(0.01)
+        writer.add(ADDRESS, 3.0, 3, 10)
+        await writer.close()
+        writer.add(ADDRESS, 4.0, 4, 10)
+        await asyncio.sleep(0.01)
+        return writer
+
+    writer = asyncio.run(scenario())
+    # 攒够batch_size立即写入，其余在close()时写入；close()之后的样本被忽略
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert batches[0][0] == ("10.0.0.1:7777", 0.0, 0, 10)
+    assert not writer._pending
+    assert writer._task is None
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""查询指标与Prometheus文本格式"""
+
+from scpsl import QueryMetrics
+
+
+def test_render_escapes_label_values_and_skips_unnamed_observations():
+    metrics = QueryMetrics()
+    metrics.observe(('a"b\\c\n', 1), "ok", 0.01)
+    metrics.observe(None, "timeout", 1.0)
+    text = metrics.render_prometheus()
+    assert 'server="a\\"b\\\\c\\n:1",le="0.01"} 1' in text
+    assert 'scpsl_query_outcomes_total{outcome="timeout"} 1' in text
+    assert list(metrics.servers) == [('a"b\\c\n', 1)]
+    assert metrics.latency.count == 2
+
+
+def test_quantile_interpolates_within_bucket():
+    metrics = QueryMetrics()
+    for _ in range(10):
+        metrics.observe(("h", 1), "ok", 0.03)
+    assert 0.025 < metrics.latency.quantile(0.5) <= 0.05
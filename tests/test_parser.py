@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""A2S响应解析"""
+
+import struct
+
+import pytest
+
+from scpsl import A2SError, parse_info, parse_players, parse_rules
+from scpsl.parser import PlayerInfo, ServerDetails
+
+HEADER = b"\xFF\xFF\xFF\xFF"
+
+
+def info_packet(tail=struct.pack("<HBBBccBB", 0, 12, 30, 1, b"d", b"w", 1, 0), extra=b""):
+    return (
+        HEADER + b"\x49\x11"
+        + "服务器".encode() + b"\x00" + b"Facility\x00" + b"scpsl\x00" + b"SCP: Secret Laboratory\x00"
+        + tail + extra
+    )
+
+
+def test_parse_info_fields():
+    info = parse_info(info_packet(), ping=42)
+    assert (info.name, info.map, info.game) == ("服务器", "Facility", "SCP: Secret Laboratory")
+    assert (info.players, info.max_players, info.bots) == (12, 30, 1)
+    assert (info.server_type, info.platform, info.password, info.vac) == ("d", "w", True, False)
+    assert info.ping == 42
+    assert info.game_port is None
+
+
+def test_parse_info_reads_edf_game_port():
+    info = parse_info(info_packet(extra=b"1.0.0\x00\x80" + struct.pack("<H", 7777)))
+    assert info.game_port == 7777
+
+
+def test_parse_info_ignores_truncated_edf():
+    assert parse_info(info_packet(extra=b"1.0.0\x00\x80\x61")).game_port is None
+
+
+def test_parse_info_fills_truncated_tail_with_defaults():
+    info = parse_info(info_packet(tail=struct.pack("<HB", 0, 5)))
+    assert (info.players, info.max_players) == (5, 20)
+
+
+@pytest.mark.parametrize("data", [HEADER + b"\x49", HEADER + b"\x49\x11name-without-terminator"])
+def test_parse_info_rejects_malformed(data):
+    with pytest.raises(A2SError):
+        parse_info(data)
+
+
+def test_parse_players_stops_at_truncation():
+    body = HEADER + b"\x44\x03"
+    for i, name in enumerate((b"alice", b"bob")):
+        body += bytes([i]) + name + b"\x00" + struct.pack("<lf", i, 90.0)
+    body += b"\x02carol\x00\x01"
+    assert parse_players(body) == (PlayerInfo("alice", 0, 90.0), PlayerInfo("bob", 1, 90.0))
+
+
+def test_parse_rules_and_round_time():
+    body = HEADER + b"\x45" + struct.pack("<H", 3) + b"RoundTime\x0000:05:23\x00motd\x00hi\x00broken"
+    rules = parse_rules(body)
+    assert rules == {"RoundTime": "00:05:23", "motd": "hi"}
+    assert ServerDetails(parse_info(info_packet()), (), rules).round_time == "00:05:23"
+
+
+def test_parse_rules_rejects_empty():
+    with pytest.raises(A2SError):
+        parse_rules(HEADER + b"\x45\x01")
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""分包响应重组，包括bz2压缩和CRC校验"""
+
+import bz2
+import struct
+import zlib
+
+from scpsl.reassembly import SPLIT_HEADER, SplitReassembler
+
+SOURCE = ("127.0.0.1", 7777)
+RESPONSE = b"\xFF\xFF\xFF\xFF\x45" + bytes(range(256)) * 4
+
+
+def split(payload, request_id=7, size=300, compressed_header=b""):
+    chunks = [payload[i:i + size] for i in range(0, len(payload), size)]
+    packets = []
+    for n, chunk in enumerate(chunks):
+        head = SPLIT_HEADER + struct.pack("<lBBH", request_id, len(chunks), n, size)
+        if n == 0:
+            head += compressed_header
+        packets.append(head + chunk)
+    return packets
+
+
+def feed_all(reassembler, packets):
+    results = [reassembler.feed(SOURCE, packet) for packet in packets]
+    assert all(result is None for result in results[:-1])
+    return results[-1]
+
+
+def test_reassembles_out_of_order_and_ignores_duplicates():
+    reassembler = SplitReassembler()
+    packets = split(RESPONSE)
+    assert reassembler.feed(SOURCE, packets[-1]) is None
+    assert reassembler.feed(SOURCE, packets[-1]) is None
+    assert feed_all(reassembler, packets[:-1]) == RESPONSE
+    assert reassembler.dropped == 0
+
+
+def compressed_packets(crc=None, request_id=-5):
+    data = bz2.compress(RESPONSE)
+    header = struct.pack("<lL", len(RESPONSE), zlib.crc32(RESPONSE) if crc is None else crc)
+    # 压缩响应的请求ID最高位为1，第一个分包在分包头之后多出解压后长度和CRC32
+    return split(data, request_id=request_id, size=300, compressed_header=header)
+
+
+def test_decompresses_bz2_response():
+    assert feed_all(SplitReassembler(), compressed_packets()) == RESPONSE
+
+
+def test_drops_bz2_response_with_bad_crc():
+    reassembler = SplitReassembler()
+    assert feed_all(reassembler, compressed_packets(crc=0)) is None
+    assert reassembler.dropped == 1
+
+
+def test_rejects_groups_over_buffer_limit():
+    reassembler = SplitReassembler(max_buffered=500)
+    assert reassembler.feed(SOURCE, split(RESPONSE)[0]) is None
+    assert reassembler.dropped == 1
+
+
+def test_expires_incomplete_groups():
+    reassembler = SplitReassembler(timeout=0)
+    packets = split(RESPONSE)
+    reassembler.feed(SOURCE, packets[0])
+    # 下一次feed时前一组已超时被丢弃，新的一组从头开始收集
+    reassembler.feed(SOURCE, split(RESPONSE, request_id=8)[0])
+    assert reassembler.dropped == 1
+
+
+def test_rejects_inconsistent_packets():
+    reassembler = SplitReassembler()
+    packets = split(RESPONSE)
+    reassembler.feed(SOURCE, packets[0])
+    # 同一请求ID但分包总数不同
+    bad = SPLIT_HEADER + struct.pack("<lBBH", 7, 2, 1, 300) + b"x"
+    assert reassembler.feed(SOURCE, bad) is None
+    assert reassembler.dropped == 1
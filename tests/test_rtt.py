@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""RTT估算与退避"""
+
+import pytest
+
+from scpsl import RttTable
+
+A = ("10.0.0.1", 7777)
+B = ("10.0.0.1", 7778)
+
+
+def test_unknown_endpoint_uses_initial_rto():
+    table = RttTable(initial_rto=1.0)
+    assert table.rto(A) == 1.0
+    assert not table.known(A)
+
+
+def test_first_sample_sets_srtt_and_rto():
+    table = RttTable(min_rto=0.01)
+    table.observe(A, 0.1)
+    assert table.srtt(A) == pytest.approx(0.1)
+    # RTO = SRTT + 4 * RTTVAR，第一个样本的RTTVAR为样本的一半
+    assert table.rto(A) == pytest.approx(0.3)
+
+
+def test_rto_is_clamped():
+    table = RttTable(min_rto=0.1, max_rto=3.0)
+    table.observe(A, 0.001)
+    assert table.rto(A) == 0.1
+    table.observe(B, 5.0)
+    assert table.rto(B) == 3.0
+
+
+def test_other_ports_on_the_same_host_share_the_estimate():
+    table = RttTable(min_rto=0.01)
+    table.observe(A, 0.1)
+    assert table.known(B)
+    assert table.srtt(B) is None
+    assert table.rto(B) == pytest.approx(table.rto(A))
+
+
+def test_backoff_doubles_once_and_does_not_compound():
+    table = RttTable(min_rto=0.01, max_rto=10.0)
+    table.observe(A, 0.1)
+    for _ in range(3):
+        table.backoff(A)
+        assert table.rto(A) == pytest.approx(0.6)
+    table.observe(A, 0.1)
+    assert table.rto(A) < 0.6
+
+
+def test_backoff_of_unsampled_port_uses_host_estimate():
+    table = RttTable(initial_rto=1.0, min_rto=0.01, max_rto=3.0)
+    table.observe(A, 0.1)
+    table.backoff(B)
+    table.backoff(B)
+    assert table.rto(B) == pytest.approx(0.6)
+    assert table.known(B)
+
+
+def test_endpoint_limit_evicts_oldest():
+    table = RttTable(max_endpoints=2)
+    table.observe(("10.0.0.1", 1), 0.1)
+    table.observe(("10.0.0.2", 1), 0.1)
+    assert len(table) == 2
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""SQLite数据访问层：/groups键集分页与人数历史汇总"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from scpsl import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage(str(tmp_path / "test.db"))
+    storage.open_sync()
+    yield storage
+    asyncio.run(storage.close())
+
+
+def add_bindings(path, rows):
+    # 直接写入created_at，制造同一秒内绑定的多个群聊
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO group_servers (group_id, server_ip, server_port, server_name, created_at) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+    conn.close()
+
+
+def test_group_pages_match_full_ordering(storage):
+    rows = [
+        (f"g{i:02d}", f"10.0.0.{i % 3}", 7777 + i % 2, f"s{i}", f"2026-01-01 00:00:{i // 4:02d}")
+        for i in range(25)
+    ]
+    add_bindings(storage.db_path, rows)
+
+    async def pages(server_ip=None, server_port=None):
+        result = []
+        for page in range(1, 9):
+            result += await storage.list_group_servers_page(page, 4, server_ip, server_port)
+        return result
+
+    def expected(keep):
+        matched = [row for row in rows if keep(row)]
+        return [row[0] for row in sorted(matched, key=lambda row: (row[4], row[0]), reverse=True)]
+
+    assert [row[0] for row in asyncio.run(pages())] == expected(lambda row: True)
+    assert [row[0] for row in asyncio.run(pages("10.0.0.1"))] == expected(lambda row: row[1] == "10.0.0.1")
+    assert [row[0] for row in asyncio.run(pages("10.0.0.1", 7778))] == expected(
+        lambda row: row[1] == "10.0.0.1" and row[2] == 7778
+    )
+
+
+def test_page_past_the_end_is_empty(storage):
+    add_bindings(storage.db_path, [("g1", "10.0.0.1", 7777, "s", "2026-01-01 00:00:00")])
+    assert asyncio.run(storage.list_group_servers_page(2, 10)) == []
+
+
+def test_rollups_and_purge(storage):
+    address = "10.0.0.1:7777"
+    # 两分钟的样本，第二分钟有一个离线样本
+    samples = [(address, 60.0 * minute + second, 10 + minute, 20) for minute in range(2) for second in (0, 30)]
+    samples.append((address, 150.0, -1, -1))
+
+    async def scenario():
+        await storage.insert_samples(samples)
+        while await storage.compact_step(0, now=1000.0, lag=0.0):
+            pass
+        minutes = await storage.query_history(address, 0.0, 1000.0, 1)
+        assert not await storage.compact_step(1, now=1000.0, lag=0.0)
+        deleted = await storage.purge_step(0, before=1000.0)
+        raw = await storage.query_history(address, 0.0, 1000.0, 0)
+        return minutes, deleted, raw
+
+    minutes, deleted, raw = asyncio.run(scenario())
+    # (桶, 样本数, 在线样本数, 最低人数, 最高人数, 人数总和)
+    assert minutes == [(0.0, 2, 2, 10, 10, 20), (60.0, 2, 2, 11, 11, 22), (120.0, 1, 0, None, None, 0)]
+    # 只删除已被汇总的原始样本
+    assert deleted == 5
+    assert raw == []
+
+
+def test_purge_requires_rollup(storage):
+    async def scenario():
+        await storage.insert_samples([("a", 1.0, 1, 1)])
+        return await storage.purge_step(0, before=1000.0)
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""批量查询目标的解析与展开"""
+
+import pytest
+
+from scpsl import TargetError, expand_targets
+
+
+@pytest.mark.parametrize("token", ["::1", "[::1]:7777", "1.2.3", "1.2.3.256", "a..b", "-a.com", "x_y.com", "7777", "a b"])
+def test_rejects_invalid_hosts(token):
+    with pytest.raises(TargetError):
+        expand_targets([token], 7777, 64)
+
+
+@pytest.mark.parametrize("token", ["1.2.3.4", "play.example.com", "example.com.", "localhost", "scp-1.example.cn"])
+def test_accepts_addresses_and_hostnames(token):
+    assert expand_targets([token], 7777, 64) == [(token, 7777)]
+
+
+def test_expands_ports_ranges_and_networks_in_order_without_duplicates():
+    tokens = ["1.2.3.4", "1.2.3.4:7778-7779,1.2.3.4:7777", "10.0.0.0/30:9000"]
+    assert expand_targets(tokens, 7777, 64) == [
+        ("1.2.3.4", 7777),
+        ("1.2.3.4", 7778),
+        ("1.2.3.4", 7779),
+        ("10.0.0.1", 9000),
+        ("10.0.0.2", 9000),
+    ]
+
+
+def test_small_networks_include_every_address():
+    assert expand_targets(["10.0.0.4/31"], 7777, 64) == [("10.0.0.4", 7777), ("10.0.0.5", 7777)]
+
+
+@pytest.mark.parametrize("token", ["1.2.3.4:0", "1.2.3.4:7779-7777", "1.2.3.4:x", "10.0.0.0/33"])
+def test_rejects_invalid_ports_and_networks(token):
+    with pytest.raises(TargetError):
+        expand_targets([token], 7777, 64)
+
+
+def test_limit_is_checked_before_expanding():
+    with pytest.raises(TargetError):
+        expand_targets(["10.0.0.0/8:1-65535"], 7777, 64)
+    assert len(expand_targets(["10.0.0.0/26"], 7777, 62)) == 62